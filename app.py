@@ -1,66 +1,137 @@
-import os
-import pandas as pd
+import sys
 import streamlit as st
 
 # Import modules
-from scripts.featureEngineering import add_flight_day
-from scripts.stats import tidy_from_wide, analyze_r1_vs_L
-from scripts.graphMaking import make_figure
+from scripts.graphMaking import (cached_figure, cached_correlation_heatmap, chart_figure, FIGURE_CACHE,
+                                 RENDER_MODES, WEBGL_SUBJECT_THRESHOLD)
+from scripts.dataCache import file_signature
+from scripts.artifactStore import list_datasets, load_cube, load_stats
+from scripts.contrasts import analyze_contrasts
+from scripts.panelStore import get_panel_store
+from scripts.subjectIndex import load_subject_index
+from scripts.trajectories import fit_trajectories
+from scripts.instrumentation import NULL_PROFILER, StageProfiler, profile_target
 
-# Load Data
-def list_final_data(folder="final_data"):
-    """Return list of CSV files in final_data folder."""
-    return [f for f in os.listdir(folder) if f.endswith(".csv")]
+# Number of datasets kept in memory (least recently used are evicted)
+MAX_CACHED_DATASETS = 8
+
+# Dataset choice that plots analytes from every panel side by side
+ALL_PANELS = "All panels (combined)"
 
-def load_final_data(fname, folder="final_data"):
-    """Load selected CSV file as pandas DataFrame."""
-    path = os.path.join(folder, fname)
-    return pd.read_csv(path)
+# Per-stage timings: PIPELINE_PROFILE=1 (or a JSONL path), or `streamlit run app.py -- --profile`
+PROFILING = profile_target() is not None or "--profile" in sys.argv[1:]
+
+# Load Data
+@st.cache_resource(max_entries=MAX_CACHED_DATASETS, show_spinner="Preparing dataset...")
+def _prepare_dataset(path, mtime_ns, digest, subjects_digest, _profiler=NULL_PROFILER):
+    """
+    Stats table of one dataset; its values are read from the cube (_dataset_cube),
+    so no process holds a private copy of the tidy frame.
+    Cached across reruns and sessions; (path, mtime_ns, digest, subjects_digest)
+    is the cache key, so an edited CSV or ISA study table is recomputed while
+    widget changes reuse the table.
+    On a cold start it comes from the on-disk artifact store when fresh (the
+    artifacts are built first otherwise). The table is shared and must not be
+    modified in place.
+    `_profiler` is not part of the key; it only sees stages on a cache miss.
+    """
+    return load_stats(path, _profiler)
+
+def prepare_dataset(path, profiler=NULL_PROFILER):
+    """Return the cached stats_df for a final_data CSV or long-format upload."""
+    return _prepare_dataset(*file_signature(path), load_subject_index().digest, _profiler=profiler)
+
+@st.cache_resource(max_entries=MAX_CACHED_DATASETS, show_spinner="Mapping value cube...")
+def _dataset_cube(path, mtime_ns, digest, subjects_digest):
+    """
+    Memory-mapped value cube of one dataset (see valueCube), cached per file
+    and ISA study table version.
+    The arrays are read-only maps of the artifact files, so every dashboard
+    process shares the same pages through the OS cache.
+    """
+    return load_cube(path)
+
+@st.cache_resource(max_entries=MAX_CACHED_DATASETS, show_spinner="Computing contrasts...")
+def _dataset_contrasts(digest, _cube):
+    """Every recovery timepoint vs the L-series (contrasts.default_contrasts), cached per dataset digest."""
+    return analyze_contrasts(_cube)
+
+@st.cache_resource(max_entries=2 * MAX_CACHED_DATASETS, show_spinner="Fitting trajectories...")
+def _dataset_trajectories(digest, degree, _cube):
+    """Recovery-trajectory fits of the given degree for every analyte, cached per dataset digest."""
+    return fit_trajectories(_cube, degree)
 
 # Main App
 def main():
     st.title("Astronaut Biochemistry Dashboard")
+    # One profiler per rerun; disabled stages cost nothing
+    profiler = StageProfiler(enabled=PROFILING, target=profile_target())
 
     # 1. Sidebar file selection
     st.sidebar.header("Data Selection")
-    csv_files = list_final_data()
+    # final_data/ wide CSVs first, then long-format uploads from data/
+    csv_files = list_datasets()
 
     if not csv_files:
         st.error("No CSV files found in final_data/")
         return
 
-    selected_file = st.sidebar.selectbox("Choose dataset", csv_files)
-    df_raw = load_final_data(selected_file)
+    selected_file = st.sidebar.selectbox("Choose dataset", csv_files + [ALL_PANELS])
+    combined = selected_file == ALL_PANELS
     st.write(f"Loaded file: **{selected_file}**")
 
-    # 2. Clean with feature engineering
-    df_clean = add_flight_day(df_raw)
-
-    # 3. Transform to tidy format + run stats
-    tidy_df = tidy_from_wide(df_clean)
-    stats_df = analyze_r1_vs_L(tidy_df)
+    # 2-3. Clean, transform to tidy format + run stats (cached per file version;
+    # the combined store is built once per process)
+    with profiler.stage("prepare_dataset", dataset=selected_file) as stage:
+        if combined:
+            store = get_panel_store(csv_files, profiler)
+            stats_df, digest = store.stats, store.digest
+            cube = store.cube       # built on first use, shared like the store
+            astronaut_ids = store.tidy["astronautID"].unique().tolist()
+            stage.note(store.tidy)
+        else:
+            stats_df = prepare_dataset(selected_file, profiler)
+            signature = file_signature(selected_file)
+            subjects_digest = load_subject_index().digest
+            # figures carry sexes from the ISA table, so its version is part of their key
+            digest = f"{signature[2]}:{subjects_digest}"
+            # figure rows, contrasts, trajectories and correlations read from the cube
+            # (the full tidy frame is never loaded in this mode)
+            store = cube = _dataset_cube(*signature, subjects_digest)
+            astronaut_ids = cube.astronauts.tolist()
+            stage.note(shape=list(cube.shape))
 
     # 4. Sidebar user selections
     st.sidebar.header("Plot Controls")
 
-    analyte = st.sidebar.selectbox(
-        "Select Analyte",
-        options=tidy_df["analyte"].unique().tolist(),
-        index=tidy_df["analyte"].unique().tolist().index("sodium")
-        if "sodium" in tidy_df["analyte"].unique() else 0
-    )
+    if combined:
+        panel_of = dict(store.analytes[["analyte", "panel"]].itertuples(index=False))
+        analytes = st.sidebar.multiselect(
+            "Select Analytes",
+            options=list(panel_of),
+            default=[a for a in ["sodium", "crp"] if a in panel_of] or list(panel_of)[:1],
+            format_func=lambda a: f"{a} ({panel_of[a]})"
+        )
+    else:
+        analyte = st.sidebar.selectbox(
+            "Select Analyte",
+            options=cube.analytes.tolist(),
+            index=cube.analytes.get_loc("sodium") if "sodium" in cube.analytes else 0
+        )
+        analytes = [analyte] if analyte else []
 
     astronauts = st.sidebar.multiselect(
         "Select Astronauts",
         # Normalize IDs to uppercase for consistency
-        options=sorted([a.upper() for a in tidy_df["astronautID"].unique().tolist()]),
+        options=sorted([a.upper() for a in astronaut_ids]),
         default=[]
     )
     astronauts = [a.upper() for a in astronauts]
 
+    # sexes recorded in the ISA study table, whatever the crew size
     sex_filter = st.sidebar.radio(
         "Sex Filter",
-        ["All", "Male", "Female"],
+        ["All"] + load_subject_index().sexes,
         index=0
     )
 
@@ -71,6 +142,39 @@ def main():
     )
     show_error = None if show_error == "None" else show_error
 
+    render_mode = st.sidebar.radio(
+        "Render Mode",
+        RENDER_MODES,
+        index=0,
+        help="'aggregate' draws the median with IQR and min-max ribbons instead of one line per astronaut"
+    )
+    webgl_threshold = st.sidebar.number_input(
+        "Use WebGL above N astronauts",
+        min_value=0,
+        value=WEBGL_SUBJECT_THRESHOLD,
+        step=10
+    )
+
+    contrast_df = _dataset_contrasts(digest, cube)
+    contrast = st.sidebar.selectbox(
+        "Annotate Contrast",
+        ["None"] + contrast_df["contrast"].unique().tolist(),
+        index=0,
+        help="Mark a recovery timepoint vs the L-series: group difference, p-value and per-astronaut asterisks"
+    )
+    contrast = None if contrast == "None" else contrast
+
+    trajectory = st.sidebar.radio(
+        "Trajectory Fit",
+        ["None", "linear", "quadratic"],
+        index=0,
+        help="Least-squares recovery curve over the R-series, relative to each astronaut's L-series baseline"
+    )
+    trajectory_df = None
+    if trajectory != "None":
+        degree = 1 if trajectory == "linear" else 2
+        trajectory_df = _dataset_trajectories(digest, degree, cube)
+
     # Unify filters: Astronauts take priority, else fall back to sex filter
     if astronauts:
         astronaut_filter = astronauts
@@ -80,21 +184,55 @@ def main():
         astronaut_filter = None
 
     # 5. Generate figure
-    if analyte:
-        fig = make_figure(
-            tidy_df=tidy_df,
-            stats_df=stats_df,
-            analytes=[analyte],
-            astronaut_filter=astronaut_filter,
-            show_error=show_error
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    if analytes:
+        with profiler.stage("make_figure", analyte=", ".join(analytes)) as stage:
+            fig = cached_figure(
+                dataset_digest=digest,
+                tidy_df=store.tidy_for(analytes),
+                stats_df=store.stats_for(analytes) if combined else stats_df,
+                analytes=analytes,
+                astronaut_filter=astronaut_filter,
+                show_error=show_error,
+                render_mode=render_mode,
+                webgl_threshold=int(webgl_threshold),
+                contrast_df=contrast_df,
+                contrast=contrast,
+                trajectory_df=trajectory_df,
+                side_by_side=combined
+            )
+            stage.note(traces=len(fig["data"]))
+        with profiler.stage("plotly_chart"):
+            st.plotly_chart(chart_figure(fig), use_container_width=True)
     else:
         st.warning("Please select at least one analyte to plot.")
 
-    # 6. Optional: preview data
+    # 6. Optional: clustered cross-analyte correlations
+    st.sidebar.header("Correlations")
+    show_corr = st.sidebar.checkbox("Show correlation heatmap", value=False)
+    if show_corr:
+        method = st.sidebar.radio("Method", ["pearson", "spearman"], index=0)
+        phase = st.sidebar.radio("Samples", ["All", "Pre-flight (L)", "Recovery (R)"], index=0)
+        phase = {"All": None, "Pre-flight (L)": "L", "Recovery (R)": "R"}[phase]
+        with profiler.stage("correlation_heatmap", method=method, phase=phase):
+            corr_fig = cached_correlation_heatmap(digest, cube, method, phase)
+        st.plotly_chart(chart_figure(corr_fig), use_container_width=True)
+
+    # 7. Optional: preview data
     with st.expander("Preview Data"):
-        st.dataframe(tidy_df.head(20))
+        st.dataframe(store.tidy_for(analytes).head(20))
+        cache = FIGURE_CACHE.stats()
+        st.caption(f"Figure cache: {cache['hits']} hits, {cache['misses']} misses "
+                   f"({cache['size']}/{cache['maxsize']} stored)")
+
+    # 8. Optional: per-stage timings for this rerun
+    if profiler.enabled:
+        with st.expander("Performance"):
+            perf = profiler.summary()
+            perf["stage"] = ["  " * d + s for d, s in zip(perf["depth"], perf["stage"])]
+            cols = [c for c in ["stage", "seconds", "peak_mb", "rows", "columns"] if c in perf.columns]
+            perf = perf.astype({c: "Int64" for c in ["rows", "columns"] if c in perf.columns})
+            st.dataframe(perf[cols], hide_index=True)
+            st.caption("Stages inside prepare_dataset only appear when the dataset isn't cached yet.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,59 +1,209 @@
+import argparse
 import os
-import pandas as pd
+import sys
 
-from scripts.featureEngineering import add_flight_day
-from scripts.stats import tidy_from_wide, analyze_r1_vs_L
-from scripts.graphMaking import make_figure
+# Heavy modules (pandas, scipy, plotly, pyarrow) are imported inside the
+# functions that need them, so `--stats-only` runs never load plotly and
+# `--help` / `--list` start instantly.
+
+
+def _parse_group(choice):
+    """
+    Turn a group selection into an astronaut filter:
+    ''/'All' -> None, a sex from the ISA study table (e.g. 'Male') -> that sex,
+    'C001,C002' -> list of IDs.
+    """
+    from scripts.subjectIndex import load_subject_index
+
+    choice = (choice or "").strip()
+    if not choice or choice.lower() == "all":
+        return None
+    sexes = {s.lower(): s for s in load_subject_index().sexes}
+    if choice.lower() in sexes:
+        return sexes[choice.lower()]
+    return [c.strip().upper() for c in choice.split(",") if c.strip()]
+
+
+def _resolve_dataset(dataset, folder="final_data"):
+    """Accept a path, or a file name inside `folder`."""
+    if os.path.exists(dataset):
+        return dataset
+    return os.path.join(folder, dataset)
+
+
+def _default_analytes(tidy_df):
+    return ["sodium"] if "sodium" in tidy_df["analyte"].unique() \
+        else [tidy_df["analyte"].unique()[0]]
 
 
 def run_pipeline(filename, folder="final_data",
                  analytes=None, astronauts=None,
-                 show_error=None):
+                 show_error=None, render_mode="traces",
+                 webgl_threshold=None, output=None, profiler=None):
     """
     Run pipeline: load data, clean, tidy, stats, and show interactive plot.
+    `filename` may be a wide final_data CSV or a long-format upload
+    (e.g. folder="data", filename="..._SUBMITTED.csv"); long files are tidied
+    directly without a wide round-trip.
     `astronauts` can be:
       - None -> all
       - "Male" / "Female" -> filter by sex
       - list of IDs -> filter by astronaut IDs
+    `render_mode` is "traces" (one line per astronaut, WebGL above
+    `webgl_threshold` astronauts) or "aggregate" (median + IQR/min-max ribbons).
+    With `output`, figures are written as HTML instead of shown; several
+    analytes get the analyte name appended to the file name.
+    `profiler` is an instrumentation.StageProfiler; by default one is enabled
+    when PIPELINE_PROFILE is set.
     """
+    from scripts.artifactStore import load_or_build
+    from scripts.dataCache import file_signature
+    import plotly.io as pio
+
+    from scripts.graphMaking import cached_figure, WEBGL_SUBJECT_THRESHOLD
+    from scripts.instrumentation import StageProfiler
+
+    profiler = profiler or StageProfiler()
+
     path = os.path.join(folder, filename)
     if not os.path.exists(path):
         raise FileNotFoundError(f"File not found: {path}")
 
     print(f"\nLoading {path} ...")
-    df_raw = pd.read_csv(path)
 
-    # 1. Feature engineering
-    df_clean = add_flight_day(df_raw)
-
-    # 2. Reshape to tidy format
-    tidy_df = tidy_from_wide(df_clean)
-
-    # 3. Run stats
-    stats_df = analyze_r1_vs_L(tidy_df)
+    # 1-3. Feature engineering, tidy reshape and stats
+    # (served from final_data/*.artifacts when the CSV is unchanged)
+    with profiler.stage("load_dataset", dataset=path) as stage:
+        tidy_df, stats_df = load_or_build(path, profiler)
+        stage.note(tidy_df)
 
     # Default analyte if none chosen
     if not analytes:
-        analytes = ["sodium"] if "sodium" in tidy_df["analyte"].unique() \
-            else [tidy_df["analyte"].unique()[0]]
+        analytes = _default_analytes(tidy_df)
 
     print(f"Generating figure for analytes: {analytes}")
 
     for analyte in analytes:
         print(f"\nPlotting {analyte} ...")
-        fig = make_figure(
-            tidy_df=tidy_df,
-            stats_df=stats_df,
-            analytes=[analyte],
-            astronaut_filter=astronauts,
-            show_error=show_error
-        )
-        fig.show()
+        with profiler.stage("make_figure", analyte=analyte) as stage:
+            fig = cached_figure(
+                dataset_digest=file_signature(path)[2],
+                tidy_df=tidy_df,
+                stats_df=stats_df,
+                analytes=[analyte],
+                astronaut_filter=astronauts,
+                show_error=show_error,
+                render_mode=render_mode,
+                webgl_threshold=WEBGL_SUBJECT_THRESHOLD if webgl_threshold is None else webgl_threshold
+            )
+            stage.note(traces=len(fig["data"]))
+        if output is None:
+            with profiler.stage("show", analyte=analyte):
+                pio.show(fig, validate=False)
+            continue
+
+        root, ext = os.path.splitext(output)
+        out_file = output if len(analytes) == 1 else f"{root}_{analyte}{ext or '.html'}"
+        with profiler.stage("write_html", analyte=analyte):
+            pio.write_html(fig, out_file, include_plotlyjs="cdn", validate=False)
+        print(f"Saved {out_file}")
+
+
+def run_stats(filename, folder="final_data", analytes=None, astronauts=None, output=None,
+              profiler=None):
+    """
+    Headless stats: load (or rebuild) the tidy/stats artifacts and return the
+    analyze_r1_vs_L rows for `analytes` (all when None). Never imports plotly.
+    `astronauts` restricts within-astronaut rows (group rows are kept).
+    `output` ending in .json writes JSON records, anything else CSV; '-' prints CSV.
+    """
+    from scripts.artifactStore import load_or_build
+    from scripts.instrumentation import StageProfiler
 
+    profiler = profiler or StageProfiler()
+    path = os.path.join(folder, filename)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found: {path}")
 
-if __name__ == "__main__":
-    # List available files
-    files = [f for f in os.listdir("final_data") if f.endswith(".csv")]
+    with profiler.stage("load_dataset", dataset=path) as stage:
+        tidy_df, stats_df = load_or_build(path, profiler)
+        stage.note(tidy_df)
+
+    if analytes:
+        stats_df = stats_df[stats_df["analyte"].isin(analytes)]
+    if astronauts is not None:
+        if isinstance(astronauts, str):
+            ids = tidy_df.loc[tidy_df["sex"] == astronauts, "astronautID"].unique()
+        else:
+            ids = astronauts
+        stats_df = stats_df[(stats_df["test_type"] != "within") | stats_df["astronautID"].isin(ids)]
+    stats_df = stats_df.reset_index(drop=True)
+
+    with profiler.stage("write_stats") as stage:
+        if output == "-":
+            stats_df.to_csv(sys.stdout, index=False)
+        elif output and output.lower().endswith(".json"):
+            stats_df.to_json(output, orient="records", indent=2)
+        elif output:
+            stats_df.to_csv(output, index=False)
+        stage.note(stats_df)
+    return stats_df
+
+
+def main(argv=None):
+    """Non-interactive entry point; run without arguments for the interactive prompts."""
+    parser = argparse.ArgumentParser(description="Astronaut biochemistry pipeline (headless).")
+    parser.add_argument("--list", action="store_true", help="list available datasets and exit")
+    parser.add_argument("--dataset", help="dataset path, or a file name in final_data/")
+    parser.add_argument("--analytes", default="",
+                        help="comma-separated analytes (default: sodium or the first one; all with --stats-only)")
+    parser.add_argument("--filter", default="All",
+                        help="'All', a sex from the ISA study table (e.g. 'Male') "
+                             "or comma-separated IDs (e.g. C001,C002)")
+    parser.add_argument("--error", choices=["none", "within", "group"], default="none")
+    parser.add_argument("--render-mode", choices=["traces", "aggregate"], default="traces")
+    parser.add_argument("--stats-only", action="store_true",
+                        help="write analyze_r1_vs_L output instead of plotting (plotly is not loaded)")
+    parser.add_argument("--output", default=None,
+                        help="stats: .csv/.json path or '-' for stdout; plots: .html path "
+                             "(default: stdout CSV / open in browser)")
+    parser.add_argument("--profile", nargs="?", const="-", default=None, metavar="PATH",
+                        help="emit per-stage timing/memory JSON records to stderr, or append "
+                             "them to PATH (same as setting PIPELINE_PROFILE)")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        from scripts.artifactStore import list_datasets
+        print("\n".join(list_datasets()))
+        return 0
+    if not args.dataset:
+        parser.error("--dataset is required (use --list to see the options)")
+
+    from scripts.instrumentation import StageProfiler
+
+    folder, filename = os.path.split(_resolve_dataset(args.dataset))
+    analytes = [a.strip().lower() for a in args.analytes.split(",") if a.strip()]
+    astronauts = _parse_group(args.filter)
+    profiler = StageProfiler(enabled=True, target=args.profile) if args.profile else StageProfiler()
+
+    if args.stats_only:
+        run_stats(filename, folder=folder, analytes=analytes or None,
+                  astronauts=astronauts, output=args.output or "-", profiler=profiler)
+    else:
+        run_pipeline(filename, folder=folder, analytes=analytes or None,
+                     astronauts=astronauts,
+                     show_error=None if args.error == "none" else args.error,
+                     render_mode=args.render_mode,
+                     output=args.output, profiler=profiler)
+    return 0
+
+
+def interactive():
+    """Prompt-driven run (used when main.py is started without arguments)."""
+    from scripts.artifactStore import list_datasets, load_or_build
+
+    # List available files (final_data/ plus long-format uploads in data/)
+    files = list_datasets()
     if not files:
         raise FileNotFoundError("No CSV files found in final_data/")
 
@@ -64,36 +214,42 @@ if __name__ == "__main__":
     # Choose dataset
     idx = input(f"Select dataset [0-{len(files)-1}] (default=0): ").strip()
     idx = int(idx) if idx.isdigit() and 0 <= int(idx) < len(files) else 0
-    filename = files[idx]
+    folder, filename = os.path.split(files[idx])
 
     # Choose analytes
-    df_preview = pd.read_csv(os.path.join("final_data", filename))
-    df_preview = add_flight_day(df_preview)
-    tidy_preview = tidy_from_wide(df_preview)
+    tidy_preview, _ = load_or_build(files[idx])
     available_analytes = tidy_preview["analyte"].unique().tolist()
 
+    default_analyte = "sodium" if "sodium" in available_analytes else available_analytes[0]
+
     print("\nAvailable analytes:", ", ".join(available_analytes))
-    ana_in = input("Enter analytes (comma-separated, default=sodium): ").strip().lower()
-    analytes = [a.strip() for a in ana_in.split(",") if a.strip()] if ana_in else ["sodium"]
+    ana_in = input(f"Enter analytes (comma-separated, default={default_analyte}): ").strip().lower()
+    analytes = [a.strip() for a in ana_in.split(",") if a.strip()] if ana_in else [default_analyte]
 
     # Choose participants (All / Male / Female / Subset)
     available_astronauts = [a.upper() for a in tidy_preview["astronautID"].unique().tolist()]
     print("\nAvailable astronauts:", ", ".join(available_astronauts))
-    print("Options: 'All', 'Male', 'Female', or a comma-separated subset (e.g. C001,C002)")
-    choice = input("Select group (default=All): ").strip()
-
-    if not choice or choice.lower() == "all":
-        astronauts = None
-    elif choice.lower() in ["male", "female"]:
-        astronauts = choice.capitalize()
-    else:
-        astronauts = [c.strip().upper() for c in choice.split(",") if c.strip()]
+    from scripts.subjectIndex import load_subject_index
+    sexes = ", ".join(f"'{s}'" for s in load_subject_index().sexes)
+    print(f"Options: 'All', {sexes}, or a comma-separated subset (e.g. C001,C002)")
+    astronauts = _parse_group(input("Select group (default=All): "))
 
     # Choose error band type
     err_in = input("Show error band? [none/within/group] (default=none): ").strip().lower()
     show_error = {"none": None, "within": "within", "group": "group"}.get(err_in, None)
 
+    # Choose render mode
+    mode_in = input("Render mode? [traces/aggregate] (default=traces): ").strip().lower()
+    render_mode = mode_in if mode_in in ["traces", "aggregate"] else "traces"
+
     # Run pipeline
-    run_pipeline(filename, analytes=analytes,
+    run_pipeline(filename, folder=folder, analytes=analytes,
                  astronauts=astronauts,
-                 show_error=show_error)
\ No newline at end of file
+                 show_error=show_error,
+                 render_mode=render_mode)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        raise SystemExit(main())
+    interactive()
@@ -1,63 +1,176 @@
-import os
+import argparse
+import json
+import re
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def process_files(input_dir="cleaned_data"):
+from scripts.dataCache import file_signature, replacing
+
+MANIFEST_NAME = ".preprocess_manifest.json"
+
+# Combined outputs written by this script: <stem>_all_astronauts[...].csv
+# (per-astronaut outputs, <stem>_<astronautID>.csv, are known from the manifest)
+GENERATED_PATTERN = re.compile(r"_all_astronauts\w*$")
+
+
+def _load_manifest(input_path: Path) -> dict:
+    try:
+        with open(input_path / MANIFEST_NAME, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(input_path: Path, manifest: dict):
+    with replacing(str(input_path / MANIFEST_NAME)) as tmp, open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+
+
+def _input_files(input_path: Path, manifest: dict) -> list:
+    """
+    CSV files that are real inputs, i.e. not outputs of a previous run.
+    Outputs are the ones recorded in the manifest plus, for runs without one,
+    <stem>_all_astronauts*.csv and the <stem>_* files next to such a combined output.
+    """
+    generated = {out for entry in manifest.values() for out in entry.get("outputs", [])}
+    csv_files = [f for f in input_path.iterdir() if f.suffix == ".csv" and f.name not in generated]
+    combined = [f for f in csv_files if GENERATED_PATTERN.search(f.stem)]
+    prefixes = tuple(f.stem[:GENERATED_PATTERN.search(f.stem).start()] + "_" for f in combined)
+    return sorted(f for f in csv_files if f not in combined and not f.stem.startswith(prefixes))
+
+
+def _stat_key(path: Path) -> list:
+    """[size, mtime_ns]: an input whose stat matches its manifest entry isn't re-hashed."""
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _digest(path: Path, entry: dict) -> str:
+    """Content hash of `path`, taken from its manifest entry while the file's stat is unchanged."""
+    if entry is not None and entry.get("stat") == _stat_key(path) and "sha256" in entry:
+        return entry["sha256"]
+    return file_signature(path)[2]
+
+
+def _process_file(filepath: Path):
+    """
+    Split one cleaned CSV into the combined and per-astronaut files.
+    Returns (list of output file names, log lines); runs in a worker process.
+    """
+    filename = filepath.stem  # file name without extension
+    log = [f"\nProcessing {filepath.name}..."]
+
+    # Read CSV
+    df = pd.read_csv(filepath)
+
+    # --- Step 1: Split "Sample Name" ---
+    if "Sample Name" not in df.columns:
+        log.append(f" Skipping {filepath.name} (no 'Sample Name' column).")
+        return [], log
+
+    split_cols = df["Sample Name"].str.split("_", expand=True)
+
+    # Expected format: C001_serum_L-3 → astronautID=C001, serum (ignored), timepoint=L-3
+    if split_cols.shape[1] >= 3:
+        df["astronautID"] = split_cols[0]
+        df["timepoint"] = split_cols[2]
+    else:
+        log.append(f"Unexpected 'Sample Name' format in {filepath.name}")
+        return [], log
+
+    # --- Step 2: Check for missing values ---
+    missing = df.isnull().sum()
+    if missing.any():
+        log.append(f"Missing values found:\n {missing[missing > 0]}")
+
+    # --- Step 3: Check for duplicates ---
+    duplicates = df.duplicated().sum()
+    if duplicates > 0:
+        log.append(f"Found {duplicates} duplicated rows")
+
+    # --- Step 4: Save combined file ---
+    outputs = []
+    all_astronauts_file = filepath.parent / f"{filename}_all_astronauts.csv"
+    df.to_csv(all_astronauts_file, index=False)
+    outputs.append(all_astronauts_file.name)
+    log.append(f"saved {all_astronauts_file.name}")
+
+    # --- Step 5: Save per astronaut ---
+    for astro_id, sub_df in df.groupby("astronautID"):
+        out_file = filepath.parent / f"{filename}_{astro_id}.csv"
+        sub_df.to_csv(out_file, index=False)
+        outputs.append(out_file.name)
+        log.append(f"Saved {out_file.name}")
+
+    return outputs, log
+
+
+def process_files(input_dir="cleaned_data", incremental=True, workers=None):
+    """
+    Split every input CSV in `input_dir` into combined and per-astronaut files.
+    With `incremental`, inputs whose content hash matches the manifest (and whose
+    outputs still exist) are skipped; only inputs whose size or mtime changed
+    since the manifest was written are hashed. Remaining files are processed
+    in parallel on `workers` processes (default: one per CPU).
+    Returns the names of the files that were processed.
+    """
 
     # Ensure directory exists
     input_path = Path(input_dir)
     if not input_path.exists():
         print(f"Directory {input_dir} not found.")
-        return
+        return []
+
+    manifest = _load_manifest(input_path) if incremental else {}
 
-    # Get all CSV files
-    csv_files = [f for f in input_path.iterdir() if f.suffix == ".csv"]
+    # Get all input CSV files (generated outputs excluded)
+    csv_files = _input_files(input_path, manifest)
     if not csv_files:
         print("No CSV files found in", input_dir)
-        return
+        return []
 
+    digests = {f.name: _digest(f, manifest.get(f.name)) for f in csv_files}
+    todo = []
     for filepath in csv_files:
-        filename = filepath.stem  # file name without extension
-        print(f"\nProcessing {filepath.name}...")
+        entry = manifest.get(filepath.name)
+        unchanged = (
+            entry is not None
+            and entry.get("sha256") == digests[filepath.name]
+            and all((input_path / out).exists() for out in entry.get("outputs", []))
+        )
+        if unchanged:
+            print(f"Unchanged, skipping {filepath.name}")
+        else:
+            todo.append(filepath)
 
-        # Read CSV
-        df = pd.read_csv(filepath)
+    if len(todo) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_process_file, todo))
+    else:
+        results = [_process_file(f) for f in todo]
 
-        # --- Step 1: Split "Sample Name" ---
-        if "Sample Name" not in df.columns:
-            print(f" Skipping {filepath.name} (no 'Sample Name' column).")
-            continue
+    for filepath, (outputs, log) in zip(todo, results):
+        print("\n".join(log))
+        manifest[filepath.name] = {"sha256": digests[filepath.name], "outputs": outputs}
+    # record the current stat of every input (a touched but unchanged file is hashed once)
+    for filepath in csv_files:
+        manifest[filepath.name]["stat"] = _stat_key(filepath)
 
-        split_cols = df["Sample Name"].str.split("_", expand=True)
+    # Forget inputs that no longer exist
+    manifest = {name: entry for name, entry in manifest.items() if (input_path / name).exists()}
+    _save_manifest(input_path, manifest)
+
+    return [f.name for f in todo]
 
-        # Expected format: C001_serum_L-3 → astronautID=C001, serum (ignored), timepoint=L-3
-        if split_cols.shape[1] >= 3:
-            df["astronautID"] = split_cols[0]
-            df["timepoint"] = split_cols[2]
-        else:
-            print(f"Unexpected 'Sample Name' format in {filepath.name}")
-            continue
-
-        # --- Step 2: Check for missing values ---
-        missing = df.isnull().sum()
-        if missing.any():
-            print("Missing values found:\n", missing[missing > 0])
-
-        # --- Step 3: Check for duplicates ---
-        duplicates = df.duplicated().sum()
-        if duplicates > 0:
-            print(f"Found {duplicates} duplicated rows")
-
-        # --- Step 4: Save combined file ---
-        all_astronauts_file = filepath.parent / f"{filename}_all_astronauts.csv"
-        df.to_csv(all_astronauts_file, index=False)
-        print(f"saved {all_astronauts_file.name}")
-
-        # --- Step 5: Save per astronaut ---
-        for astro_id, sub_df in df.groupby("astronautID"):
-            out_file = filepath.parent / f"{filename}_{astro_id}.csv"
-            sub_df.to_csv(out_file, index=False)
-            print(f"Saved {out_file.name}")
 
 if __name__ == "__main__":
-    process_files("cleaned_data")
+    parser = argparse.ArgumentParser(description="Split cleaned CSVs per astronaut.")
+    parser.add_argument("input_dir", nargs="?", default="cleaned_data")
+    parser.add_argument("--full", action="store_true",
+                        help="reprocess every input, ignoring the manifest")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    process_files(args.input_dir, incremental=not args.full, workers=args.workers)
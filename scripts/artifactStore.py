@@ -0,0 +1,237 @@
+"""
+On-disk store of derived artifacts for final_data datasets and long-format uploads.
+
+Each CSV or workbook gets a sibling folder `<name>.artifacts/` holding the tidy frame and
+stats table as uncompressed Feather (Arrow IPC) files, the memory-mappable
+value cube (see valueCube) plus a `meta.json` with the analyte list and the
+hashes and flight stretch the artifacts were built from. Artifacts are
+stale as soon as the source file, the ANALYTE_INFO registry or the ISA study
+table (subject sexes, see subjectIndex) changes, or when they are requested
+with another `stretch` (see featureEngineering.parse_timepoint); until
+then an .xlsx upload is never opened again.
+
+Prebuild or verify from the repo root:
+    python -m scripts.artifactStore build
+    python -m scripts.artifactStore verify
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from .dataCache import file_signature, replacing
+from .featureEngineering import FLIGHT_STRETCH, add_flight_day
+from .instrumentation import NULL_PROFILER
+from .longFormat import is_long_format, list_long_files, read_long_tidy
+from .stats import ANALYTE_INFO, tidy_from_wide, analyze_r1_vs_L
+from .subjectIndex import load_subject_index
+from .valueCube import CUBE_FILES, build_cube, open_cube, write_cube
+
+# Bump when the tidy/stats layout or values change so old artifacts are rebuilt
+FORMAT_VERSION = 5
+ARTIFACT_SUFFIX = ".artifacts"
+
+
+def artifact_dir(csv_path: str) -> str:
+    """Folder holding the artifacts for `csv_path` (next to the CSV)."""
+    root, _ = os.path.splitext(csv_path)
+    return root + ARTIFACT_SUFFIX
+
+
+def registry_hash() -> str:
+    """Hash of the ANALYTE_INFO registry; any edit to it invalidates artifacts."""
+    payload = json.dumps(ANALYTE_INFO, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _expected_meta(csv_path: str, stretch: int = FLIGHT_STRETCH) -> dict:
+    _, _, digest = file_signature(csv_path)
+    return {
+        "format_version": FORMAT_VERSION,
+        "source_sha256": digest,
+        "registry_sha256": registry_hash(),
+        "subjects_sha256": load_subject_index().digest,
+        "stretch": stretch,
+    }
+
+
+def _read_meta(csv_path: str) -> dict | None:
+    meta_path = os.path.join(artifact_dir(csv_path), "meta.json")
+    try:
+        with open(meta_path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(csv_path: str, stretch: int = FLIGHT_STRETCH) -> bool:
+    """True if artifacts exist and were built from the current CSV, registry and subject index with `stretch`."""
+    meta = _read_meta(csv_path)
+    if meta is None:
+        return False
+    expected = _expected_meta(csv_path, stretch)
+    if any(meta.get(k) != v for k, v in expected.items()):
+        return False
+    folder = artifact_dir(csv_path)
+    return all(os.path.exists(os.path.join(folder, f))
+               for f in ["tidy.feather", "stats.feather"] + CUBE_FILES)
+
+
+def _write_frame(df: pd.DataFrame, path: str):
+    import pyarrow.feather as feather
+
+    with replacing(path) as tmp:
+        feather.write_feather(df.reset_index(drop=True), tmp, compression="uncompressed")
+
+
+def _read_frame(path: str) -> pd.DataFrame:
+    import pyarrow.feather as feather
+
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+
+def tidy_from_file(csv_path: str, profiler=NULL_PROFILER, stretch: int = FLIGHT_STRETCH) -> pd.DataFrame:
+    """
+    Tidy frame for any supported source, with R+0 at flight day `stretch`.
+    Long-format uploads (CSV or xlsx) are normalized directly; wide final_data files go
+    through add_flight_day + tidy_from_wide.
+    """
+    if is_long_format(csv_path):
+        with profiler.stage("read_long_tidy") as stage:
+            tidy_df = read_long_tidy(csv_path, stretch=stretch)
+            stage.note(tidy_df)
+        return tidy_df
+
+    with profiler.stage("read_csv") as stage:
+        df = pd.read_csv(csv_path)
+        stage.note(df)
+    with profiler.stage("add_flight_day") as stage:
+        df = add_flight_day(df, stretch)
+        stage.note(df)
+    with profiler.stage("tidy_from_wide") as stage:
+        tidy_df = tidy_from_wide(df)
+        stage.note(tidy_df)
+    return tidy_df
+
+
+def build_artifacts(csv_path: str, profiler=NULL_PROFILER, stretch: int = FLIGHT_STRETCH):
+    """
+    Run the load -> tidy -> stats chain for `csv_path` and persist it.
+    Returns (tidy_df, stats_df).
+    """
+    tidy_df = tidy_from_file(csv_path, profiler, stretch)
+    with profiler.stage("analyze_r1_vs_L") as stage:
+        stats_df = analyze_r1_vs_L(tidy_df)
+        stage.note(stats_df)
+
+    folder = artifact_dir(csv_path)
+    os.makedirs(folder, exist_ok=True)
+    with profiler.stage("write_artifacts"):
+        _write_frame(tidy_df, os.path.join(folder, "tidy.feather"))
+        _write_frame(stats_df, os.path.join(folder, "stats.feather"))
+    with profiler.stage("write_cube") as stage:
+        cube = build_cube(tidy_df)
+        write_cube(cube, folder)
+        stage.note(shape=list(cube.shape))
+
+    # meta.json is written last, so an interrupted build is seen as stale
+    meta = _expected_meta(csv_path, stretch)
+    meta["analytes"] = tidy_df["analyte"].unique().tolist() if not tidy_df.empty else []
+    with replacing(os.path.join(folder, "meta.json")) as tmp, open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, indent=2)
+
+    return tidy_df, stats_df
+
+
+def load_artifacts(csv_path: str, stretch: int = FLIGHT_STRETCH):
+    """
+    Read the stored Feather artifacts for `csv_path` into pandas frames
+    (a copy of the file contents; only the value cube stays memory-mapped).
+    Returns (tidy_df, stats_df, analytes) or None if missing or stale.
+    """
+    if not is_fresh(csv_path, stretch):
+        return None
+    folder = artifact_dir(csv_path)
+    tidy_df = _read_frame(os.path.join(folder, "tidy.feather"))
+    stats_df = _read_frame(os.path.join(folder, "stats.feather"))
+    return tidy_df, stats_df, _read_meta(csv_path)["analytes"]
+
+
+def load_or_build(csv_path: str, profiler=NULL_PROFILER, stretch: int = FLIGHT_STRETCH):
+    """
+    Return (tidy_df, stats_df), from disk when fresh, otherwise rebuilt and stored.
+    `profiler` (see instrumentation.StageProfiler) records each stage that runs.
+    `stretch` places R+0 on the flight-day axis; one stretch is stored per file.
+    """
+    with profiler.stage("load_artifacts") as stage:
+        cached = load_artifacts(csv_path, stretch)
+        stage.note(cached[0] if cached is not None else None, hit=cached is not None)
+    if cached is not None:
+        return cached[0], cached[1]
+    return build_artifacts(csv_path, profiler, stretch)
+
+
+def load_stats(csv_path: str, profiler=NULL_PROFILER, stretch: int = FLIGHT_STRETCH) -> pd.DataFrame:
+    """
+    Stats table for `csv_path`, from disk when fresh, otherwise rebuilt with
+    the other artifacts. Only the small stats file is read, not the tidy frame
+    (pair it with load_cube for the values).
+    """
+    if not is_fresh(csv_path, stretch):
+        return build_artifacts(csv_path, profiler, stretch)[1]
+    with profiler.stage("load_stats") as stage:
+        stats_df = _read_frame(os.path.join(artifact_dir(csv_path), "stats.feather"))
+        stage.note(stats_df)
+    return stats_df
+
+
+def load_cube(csv_path: str, profiler=NULL_PROFILER, stretch: int = FLIGHT_STRETCH):
+    """Memory-mapped ValueCube for `csv_path`, (re)building the artifacts first if stale."""
+    if not is_fresh(csv_path, stretch):
+        build_artifacts(csv_path, profiler, stretch)
+    with profiler.stage("open_cube"):
+        return open_cube(artifact_dir(csv_path))
+
+
+def list_datasets(final_folder: str = "final_data", long_folder: str = "data") -> list:
+    """
+    Paths of every dataset the pipeline can load: wide CSVs in `final_folder`
+    followed by long-format uploads in `long_folder` (skipped when None).
+    """
+    paths = []
+    if os.path.isdir(final_folder):
+        paths += sorted(os.path.join(final_folder, f)
+                        for f in os.listdir(final_folder) if f.endswith(".csv"))
+    if long_folder:
+        # files with fresh artifacts were long-format when built, no need to reopen them
+        paths += [os.path.join(long_folder, f) for f in list_long_files(long_folder, known=is_fresh)]
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prebuild or verify final_data artifacts.")
+    parser.add_argument("command", choices=["build", "verify"])
+    parser.add_argument("--folder", default="final_data", help="folder of wide datasets")
+    parser.add_argument("--long-folder", default="data", help="folder of long-format uploads")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild even if artifacts are fresh (build only)")
+    args = parser.parse_args(argv)
+
+    stale = 0
+    for path in list_datasets(args.folder, args.long_folder):
+        fresh = is_fresh(path)
+        if args.command == "verify":
+            print(f"{'ok   ' if fresh else 'STALE'} {path}")
+            stale += not fresh
+        elif fresh and not args.force:
+            print(f"up to date {path}")
+        else:
+            build_artifacts(path)
+            print(f"built {artifact_dir(path)}")
+    return 1 if stale else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+"""
+Benchmark suite for the whole pipeline on synthetic cohorts.
+
+Times and memory-profiles process_files, add_flight_day, tidy_from_wide,
+analyze_r1_vs_L, build_cube and make_figure over a grid of cohort sizes and writes the
+results as JSON records, so runs can be diffed for regressions.
+
+    python -m scripts.benchmark --out bench_results.json
+    python -m scripts.benchmark --subjects 4,64 --analytes 20,500 --timepoints 6
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from .featureEngineering import add_flight_day
+from .stats import tidy_from_wide, analyze_r1_vs_L
+from .syntheticData import make_wide_panel, registered_analytes, synthetic_analytes
+from .valueCube import build_cube
+
+DEFAULT_SUBJECTS = [4, 32, 128]
+DEFAULT_ANALYTES = [20, 100, 500]
+DEFAULT_TIMEPOINTS = [6]
+
+
+def _measure(fn, repeat: int = 3):
+    """
+    Return (result, best wall time in seconds over `repeat` runs, peak traced
+    memory in MB). Memory is traced in one extra run so tracemalloc's overhead
+    doesn't leak into the timings.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak / 2**20
+
+
+def _process_files_stage(wide):
+    """process_files on a temp folder holding the synthetic CSV (silenced output)."""
+    from preprocess import process_files
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wide.to_csv(os.path.join(tmp, "synthetic_TRANSFORMED.csv"), index=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return process_files(tmp, incremental=False, workers=1)
+
+
+def run_case(n_subjects: int, n_timepoints: int, n_analytes: int, seed: int = 0,
+             figure: bool = True, repeat: int = 3) -> list:
+    """Benchmark every stage for one cohort size; returns one record per stage."""
+    wide = make_wide_panel(n_subjects, n_timepoints, n_analytes, seed=seed)
+    analytes = synthetic_analytes(n_analytes)
+    size = {"n_subjects": n_subjects, "n_timepoints": n_timepoints, "n_analytes": n_analytes}
+    records = []
+
+    def record(stage, fn, rows_in):
+        result, seconds, peak_mb = _measure(fn, repeat)
+        records.append({"stage": stage, **size, "rows_in": rows_in,
+                        "seconds": round(seconds, 6), "peak_mb": round(peak_mb, 3)})
+        return result
+
+    with registered_analytes(analytes):
+        # process_files reads "Sample Name"; the other stages start from the split frame
+        record("process_files", lambda: _process_files_stage(wide.drop(columns=["astronautID", "timepoint"])),
+               len(wide))
+        clean = record("add_flight_day", lambda: add_flight_day(wide), len(wide))
+        tidy = record("tidy_from_wide", lambda: tidy_from_wide(clean), len(clean))
+        stats_df = record("analyze_r1_vs_L", lambda: analyze_r1_vs_L(tidy), len(tidy))
+        record("build_cube", lambda: build_cube(tidy), len(tidy))
+        if figure:
+            from .graphMaking import make_figure
+            record("make_figure", lambda: make_figure(tidy, stats_df, [analytes[0]], show_error="within"),
+                   len(tidy))
+    return records
+
+
+def run_grid(subjects=None, timepoints=None, analytes=None, seed: int = 0,
+             figure: bool = True, repeat: int = 3) -> dict:
+    """Run run_case over the full grid; returns {"meta": ..., "results": [...]}."""
+    # Warm-up so one-off import costs (scipy, plotly) don't land on the first case
+    run_case(2, 3, 2, seed=seed, figure=figure, repeat=1)
+
+    results = []
+    for n_s in subjects or DEFAULT_SUBJECTS:
+        for n_t in timepoints or DEFAULT_TIMEPOINTS:
+            for n_a in analytes or DEFAULT_ANALYTES:
+                print(f"subjects={n_s} timepoints={n_t} analytes={n_a}", file=sys.stderr)
+                results += run_case(n_s, n_t, n_a, seed=seed, figure=figure, repeat=repeat)
+
+    import numpy as np
+    import pandas as pd
+    meta = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "seed": seed,
+        "repeat": repeat,
+    }
+    return {"meta": meta, "results": results}
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic cohorts.")
+    parser.add_argument("--subjects", type=_int_list, default=DEFAULT_SUBJECTS)
+    parser.add_argument("--timepoints", type=_int_list, default=DEFAULT_TIMEPOINTS)
+    parser.add_argument("--analytes", type=_int_list, default=DEFAULT_ANALYTES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is kept)")
+    parser.add_argument("--no-figure", action="store_true", help="skip the make_figure stage")
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    report = run_grid(args.subjects, args.timepoints, args.analytes,
+                      seed=args.seed, figure=not args.no_figure, repeat=args.repeat)
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {len(report['results'])} records to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,180 @@
+"""
+Generalized timepoint contrasts: any timepoint (group) against any baseline.
+
+analyze_r1_vs_L answers one question, R+1 vs the L-series. analyze_contrasts
+evaluates a list of contrasts (e.g. R+45 vs L, R+82 vs L, R+82 vs R+1) for
+every analyte in one pass over the analyte x astronaut x timepoint values of
+a ValueCube (see valueCube), with the same two tests:
+  - within: one-sample t-test of the baseline draws against the target value
+            (the mean of the target draws when the target spans several timepoints)
+  - group:  paired t-test of per-astronaut baseline means vs target values
+
+Timepoint groups are tuples of labels ('R+45'; matched by flight day, so
+'R1' and 'R+01' match 'R+1') or phases: 'L' (every L-series label) and
+'R' (every R-series label).
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .featureEngineering import parse_timepoint, parse_timepoints
+from .stats import _round
+from .valueCube import ValueCube, as_cube
+
+PHASES = ["L", "R"]
+
+CONTRAST_COLUMNS = ["contrast", "analyte", "astronautID", "test_type",
+                    "n_base", "mean_base", "n_target", "mean_target",
+                    "std_base", "se_base", "t_stat", "p_value", "effect_size", "target_day"]
+
+
+class Contrast(NamedTuple):
+    """`target` timepoints compared against `baseline` timepoints."""
+    name: str
+    target: tuple
+    baseline: tuple = ("L",)
+
+
+def make_contrast(target, baseline="L", name=None) -> Contrast:
+    """Contrast from labels/phases; a single string is a one-element group."""
+    target = (target,) if isinstance(target, str) else tuple(target)
+    baseline = (baseline,) if isinstance(baseline, str) else tuple(baseline)
+    return Contrast(name or f"{'+'.join(target)} vs {'+'.join(baseline)}", target, baseline)
+
+
+def default_contrasts(tidy) -> list:
+    """Every recovery timepoint in `tidy` (tidy frame or ValueCube) against the L-series, in flight-day order."""
+    timepoints = tidy.timepoints if isinstance(tidy, ValueCube) else tidy["timepoint"].dropna().unique()
+    labels = sorted(str(tp) for tp in timepoints)
+    recovery = [tp for tp in labels if tp.strip().upper().startswith("R")]
+    by_day = {}
+    for label, day in sorted(zip(recovery, parse_timepoints(recovery)), key=lambda p: p[1]):
+        by_day.setdefault(day, label)  # one contrast per flight day ('R1' / 'R+1')
+    return [make_contrast(label) for label in by_day.values()]
+
+
+def _group_mask(labels: pd.Index, group: tuple) -> np.ndarray:
+    """Which of the timepoint `labels` belong to a target/baseline group."""
+    norm = pd.Index(labels.astype(str)).str.strip().str.upper()
+    days = parse_timepoints(norm)
+    mask = np.zeros(len(norm), dtype=bool)
+    for item in group:
+        item = str(item).strip().upper()
+        if item in PHASES:
+            mask |= np.asarray(norm.str.startswith(item), dtype=bool)
+        else:
+            mask |= days == parse_timepoint(item)
+    return mask
+
+
+def analyze_contrasts(tidy, contrasts=None) -> pd.DataFrame:
+    """
+    Evaluate every contrast for every analyte; returns a long table with one
+    block of within rows + a group row per (contrast, analyte), as in
+    analyze_r1_vs_L. `tidy` is a tidy frame or a ValueCube (e.g.
+    artifactStore.load_cube), which is used as is. `contrasts` are Contrasts
+    or target labels (vs L); default: default_contrasts(tidy).
+    `target_day` is the flight day of the target (mean over its timepoints),
+    used by make_figure to place the annotation.
+    """
+    from scipy import stats  # imported lazily: only needed when stats are recomputed
+
+    if isinstance(tidy, pd.DataFrame) and tidy.empty:
+        return pd.DataFrame(columns=CONTRAST_COLUMNS)
+    cube = as_cube(tidy)
+    if contrasts is None:
+        contrasts = default_contrasts(cube)
+    contrasts = [c if isinstance(c, Contrast) else make_contrast(c) for c in contrasts]
+    if not contrasts or cube.values.size == 0:
+        return pd.DataFrame(columns=CONTRAST_COLUMNS)
+
+    values = cube.by_analyte()
+    analytes, astronauts, timepoints = cube.analytes, cube.astronauts, cube.timepoints
+    tp_days = cube.day_values
+    base_m = np.array([_group_mask(timepoints, c.baseline) for c in contrasts], dtype=float)
+    targ_m = np.array([_group_mask(timepoints, c.target) for c in contrasts], dtype=float)
+    with np.errstate(invalid="ignore"):
+        target_day = (targ_m @ np.nan_to_num(tp_days)) / (targ_m @ ~np.isnan(tp_days))
+
+    ## Per (contrast, analyte, astronaut) aggregates: C x A x S
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.0)
+    n_base = np.einsum("ast,ct->cas", valid.astype(float), base_m)
+    n_targ = np.einsum("ast,ct->cas", valid.astype(float), targ_m)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_base = np.einsum("ast,ct->cas", x, base_m) / n_base
+        mean_targ = np.einsum("ast,ct->cas", x, targ_m) / n_targ
+        # two-pass variance over the baseline draws
+        dev = np.where(valid[None] & (base_m[:, None, None, :] > 0),
+                       values[None] - mean_base[..., None], 0.0)
+        std_base = np.sqrt((dev ** 2).sum(axis=3) / (n_base - 1))
+
+    ## Within-astronaut tests
+    ok = (n_base >= 2) & (n_targ >= 1)
+    wc, wa, ws = np.nonzero(ok)
+    w_n, w_mean, w_targ, w_std = n_base[ok], mean_base[ok], mean_targ[ok], std_base[ok]
+    varying = w_std > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w_se = np.where(varying, w_std / np.sqrt(w_n), np.nan)
+        w_t = (w_mean - w_targ) / w_se
+        w_d = np.where(varying, (w_targ - w_mean) / w_std, np.nan)
+
+    ## Group tests: paired over astronauts with a valid within comparison
+    mean_mat = np.where(ok, mean_base, np.nan)
+    targ_mat = np.where(ok, mean_targ, np.nan)
+    n_group = ok.sum(axis=2)
+    gc, ga = np.nonzero(n_group >= 2)
+    g_n = n_group[gc, ga]
+    g_base, g_targ = mean_mat[gc, ga], targ_mat[gc, ga]
+    g_diff = g_targ - g_base
+    with np.errstate(divide="ignore", invalid="ignore"):
+        g_mean_base = np.nanmean(g_base, axis=1) if len(gc) else np.array([])
+        g_mean_targ = np.nanmean(g_targ, axis=1) if len(gc) else np.array([])
+        diff_mean = np.nanmean(g_diff, axis=1) if len(gc) else np.array([])
+        diff_std = np.nanstd(g_diff, axis=1, ddof=1) if len(gc) else np.array([])
+        g_t = diff_mean / (diff_std / np.sqrt(g_n))
+        g_d = np.where(diff_std > 0, diff_mean / diff_std, np.nan)
+
+    ## One vectorized evaluation of the two-sided p-values
+    t_all = np.concatenate([w_t, g_t])
+    p_all = 2 * stats.t.sf(np.abs(t_all), df=np.concatenate([w_n - 1, g_n - 1]))
+
+    names = np.array([c.name for c in contrasts], dtype=object)
+    within_df = pd.DataFrame({
+        "contrast": names[wc],
+        "analyte": analytes.to_numpy()[wa],
+        "astronautID": astronauts.to_numpy()[ws],
+        "test_type": "within",
+        "n_base": w_n.astype(int),
+        "mean_base": _round(w_mean, 2),
+        "n_target": n_targ[ok].astype(int),
+        "mean_target": _round(w_targ, 2),
+        "std_base": _round(w_std, 2),
+        "se_base": _round(w_se, 2),
+        "t_stat": _round(w_t, 3),
+        "p_value": _round(p_all[:len(wc)], 4),
+        "effect_size": _round(w_d, 3),
+        "target_day": target_day[wc],
+    })
+    group_df = pd.DataFrame({
+        "contrast": names[gc],
+        "analyte": analytes.to_numpy()[ga],
+        "astronautID": "ALL",
+        "test_type": "group",
+        "n_base": g_n.astype(int),
+        "mean_base": _round(g_mean_base, 2),
+        "n_target": g_n.astype(int),
+        "mean_target": _round(g_mean_targ, 2),
+        "t_stat": _round(g_t, 3),
+        "p_value": _round(p_all[len(wc):], 4),
+        "effect_size": _round(g_d, 3),
+        "target_day": target_day[gc],
+    }, columns=CONTRAST_COLUMNS)
+
+    # Contrast order as given, then analyte; within rows before the group row
+    results = pd.concat([within_df, group_df.astype(within_df.dtypes.to_dict())], ignore_index=True)
+    order = np.lexsort((np.r_[ws, np.zeros(len(gc), dtype=int)],
+                        np.r_[np.zeros(len(wc), dtype=int), np.ones(len(gc), dtype=int)],
+                        np.r_[wa, ga], np.r_[wc, gc]))
+    return results.iloc[order].reset_index(drop=True)[CONTRAST_COLUMNS]
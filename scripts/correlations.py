@@ -0,0 +1,109 @@
+"""
+Cross-analyte correlation matrices.
+
+The values of a ValueCube (built from the tidy frame when one is passed) are
+laid out as a sample x analyte matrix (a sample is one astronaut at one
+timepoint) and every pairwise correlation is computed with whole-matrix
+products over a missing-value mask, so each pair uses the samples where both
+analytes were measured (pairwise-complete, as DataFrame.corr does) without a
+Python loop over pairs.
+
+    pearson    pairwise-complete Pearson r
+    spearman   Pearson r of the ranks; each analyte is ranked once over its
+               own measured samples (identical to pairwise ranking when
+               nothing is missing)
+
+`phase` restricts the samples to pre-flight ('L') or recovery ('R') timepoints.
+"""
+import numpy as np
+import pandas as pd
+
+from .valueCube import as_cube
+
+METHODS = ["pearson", "spearman"]
+PHASES = [None, "L", "R"]
+
+# Pairs measured together in fewer samples than this get NaN
+DEFAULT_MIN_PERIODS = 3
+
+
+def sample_matrix(tidy, phase: str = None) -> pd.DataFrame:
+    """
+    Samples (astronautID, timepoint) x analytes, duplicates averaged, NaN
+    where an analyte wasn't measured. `tidy` is a tidy frame or a ValueCube
+    (used as is). `phase` 'L' or 'R' keeps only that phase's timepoints.
+    """
+    if phase not in PHASES:
+        raise ValueError(f"phase must be one of {PHASES}, got {phase!r}")
+    cube = as_cube(tidy)
+    labels = cube.timepoints.astype(str)
+
+    # samples ordered by astronaut, then timepoint label
+    order = np.argsort(labels.to_numpy(dtype=str), kind="stable")
+    if phase is not None:
+        order = order[np.asarray(labels[order].str.upper().str.startswith(phase), dtype=bool)]
+    block = np.asarray(cube.values[:, order, :], dtype=float)          # S x T' x A
+    s_pos, t_pos = np.nonzero(~np.isnan(block).all(axis=2))
+
+    index = pd.MultiIndex.from_arrays(
+        [cube.astronauts[s_pos], cube.timepoints[order][t_pos]],
+        names=["astronautID", "timepoint"])
+    return pd.DataFrame(block[s_pos, t_pos], index=index, columns=cube.analytes)
+
+
+def _pairwise_pearson(X: np.ndarray, min_periods: int) -> np.ndarray:
+    """Pairwise-complete Pearson r of the columns of X (samples x variables)."""
+    mask = ~np.isnan(X)
+    M = mask.astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # centring first keeps the sums-of-products small (less cancellation)
+        Z = np.where(mask, X - np.nanmean(np.where(mask, X, np.nan), axis=0), 0.0)
+        n = M.T @ M                          # samples shared by each pair
+        sx = Z.T @ M                         # [i, j]: sum of x_i where j is also measured
+        sxx = (Z * Z).T @ M
+        cov = Z.T @ Z - sx * sx.T / n
+        var = sxx - sx ** 2 / n              # [i, j]: variance term of x_i on the pair's samples
+        degenerate = (var <= 1e-12 * sxx) | (var.T <= 1e-12 * sxx.T)
+        r = cov / np.sqrt(var * var.T)
+    r[(n < min_periods) | degenerate] = np.nan
+    np.clip(r, -1.0, 1.0, out=r)
+    diagonal = np.diagonal(r).copy()
+    np.fill_diagonal(r, np.where(np.isnan(diagonal), np.nan, 1.0))
+    return r
+
+
+def correlation_matrix(tidy, method: str = "pearson", phase: str = None,
+                       min_periods: int = DEFAULT_MIN_PERIODS) -> pd.DataFrame:
+    """Analyte x analyte correlation frame (see module docstring for the options)."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+    samples = sample_matrix(tidy, phase)
+    X = samples.to_numpy()
+    if method == "spearman":
+        X = samples.rank(method="average").to_numpy()   # NaNs stay NaN
+    r = _pairwise_pearson(X, min_periods)
+    return pd.DataFrame(r, index=samples.columns, columns=samples.columns)
+
+
+def cluster_order(corr: pd.DataFrame) -> np.ndarray:
+    """
+    Leaf order of an average-linkage clustering on 1 - r, so correlated
+    analytes sit next to each other; pairs without a correlation count as r = 0.
+    """
+    from scipy.cluster.hierarchy import leaves_list, linkage
+    from scipy.spatial.distance import squareform
+
+    if len(corr) < 3:
+        return np.arange(len(corr))
+    dist = 1.0 - np.nan_to_num(corr.to_numpy(), nan=0.0)
+    dist = np.clip((dist + dist.T) / 2, 0.0, 2.0)
+    np.fill_diagonal(dist, 0.0)
+    return leaves_list(linkage(squareform(dist, checks=False), method="average"))
+
+
+def clustered_correlations(tidy, method: str = "pearson", phase: str = None,
+                           min_periods: int = DEFAULT_MIN_PERIODS) -> pd.DataFrame:
+    """correlation_matrix with rows and columns in cluster_order."""
+    corr = correlation_matrix(tidy, method, phase, min_periods)
+    order = cluster_order(corr)
+    return corr.iloc[order, order]
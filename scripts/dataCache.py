@@ -0,0 +1,89 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+
+
+@lru_cache(maxsize=64)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    """
+    SHA-256 of a file's content.
+    Memoized on (path, mtime, size) so an unchanged file is only hashed once per process.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@contextmanager
+def replacing(path: str):
+    """
+    Yield a temp path next to `path` that replaces `path` when the block
+    succeeds (and is removed when it fails). The name is unique per process
+    and thread, so concurrent rebuilds of the same file don't share a temp file.
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def file_signature(path: str) -> tuple:
+    """
+    Return (absolute path, mtime_ns, content hash) identifying a dataset file.
+    Used as a cache key: any edit to the file changes the signature.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    return path, st.st_mtime_ns, _file_digest(path, st.st_mtime_ns, st.st_size)
+
+
+class FigureCache:
+    """
+    Bounded, thread-safe LRU cache of built figures.
+    Values are plain figure dicts (parsed JSON: lists, numbers and strings),
+    handed out without a copy; callers treat them as read-only.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        """Return the cached value for `key`, calling `build()` on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = build()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._entries), "maxsize": self.maxsize}
@@ -1,42 +1,72 @@
+import re
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
 
-def parse_timepoint(timepoint: str) -> int:
+# Days the (3-day) flight is stretched to on the flight-day axis: R+0 -> FLIGHT_STRETCH
+FLIGHT_STRETCH = 30
+
+# 'L-3', 'L0', 'R+1', 'r + 45' ...: phase letter, optional signs, day number
+_TIMEPOINT_RE = re.compile(r"([LR])[+-]*(\d*)")
+
+
+@lru_cache(maxsize=4096)
+def _label_day(label: str, stretch: int):
+    """Flight day for one normalized label; cached so each label is parsed once per process."""
+    if not label.startswith(("L", "R")):
+        return np.nan
+    match = _TIMEPOINT_RE.fullmatch(label.replace(" ", ""))
+    if match is None:
+        raise ValueError(f"Unrecognized timepoint label: {label!r}")
+    number = int(match.group(2) or "0")
+    return -number if match.group(1) == "L" else number + stretch
+
+
+def parse_timepoint(timepoint: str, stretch: int = FLIGHT_STRETCH) -> int:
     """
     Convert timepoint strings like 'L-3', 'L0', 'R+0', 'R+1' into numeric flight days
     on a stretched scale.
     In particular, we are converting the 3 dats of flight into 30 days so there is a
     difference, the final chart will have fake data in it.
-    Convention:
+    Convention (stretch=30):
         L-0 ->   0   (launch day = Flight Day 0)
         L-3 ->  -3   (3 days before launch)
         R+0 ->  30   (last day in space, stretched to day 30)
         R+1 ->  31   (first recovery day)
         R+N ->  N+30 (general rule for post-launch days)
     """
-    label = str(timepoint).strip().upper()
+    return _label_day(str(timepoint).strip().upper(), stretch)
 
-    if label.startswith("L"):  # Pre-launch
-        number = int(label.replace("L", "").replace("+", "").replace("-", "") or "0")
-        return -number
-    elif label.startswith("R"):  # Return / post-flight
-        number = int(label.replace("R", "").replace("+", "").replace("-", "") or "0")
-        return number + 30
 
-    return np.nan
+def parse_timepoints(timepoints, stretch: int = FLIGHT_STRETCH) -> np.ndarray:
+    """
+    Vectorized parse_timepoint for a column of labels.
+    Each distinct label is parsed once and the days are mapped back through
+    integer codes (the categorical codes when the column is categorical).
+    Returns int64 days, or float64 when some labels can't be parsed (NaN).
+    """
+    if isinstance(getattr(timepoints, "dtype", None), pd.CategoricalDtype):
+        codes, uniques = np.asarray(timepoints.cat.codes), timepoints.cat.categories
+    else:
+        codes, uniques = pd.factorize(np.asarray(timepoints, dtype=object))
+    # trailing NaN is picked up by code -1 (missing label)
+    days = np.array([parse_timepoint(tp, stretch) for tp in uniques] + [np.nan], dtype=float)[codes]
+    return days if np.isnan(days).any() else days.astype(np.int64)
 
 
-def add_flight_day(df: pd.DataFrame) -> pd.DataFrame:
+def add_flight_day(df: pd.DataFrame, stretch: int = FLIGHT_STRETCH) -> pd.DataFrame:
     """
     Add a 'flight_day' column to a dataframe that already has 'timepoint' and 'astronautID'.
     Drops 'Sample Name' if present, since it's redundant.
+    `stretch` is the flight day R+0 is drawn at (see parse_timepoint).
     """
     df = df.copy()
     if "timepoint" not in df.columns:
         raise ValueError("DataFrame must contain a 'timepoint' column")
 
-    # create numeric scale
-    df["flight_day"] = df["timepoint"].apply(parse_timepoint)
+    # create numeric scale (one parse per distinct label)
+    df["flight_day"] = parse_timepoints(df["timepoint"], stretch)
 
     # drop redundant 'Sample Name' if it exists
     if "Sample Name" in df.columns:
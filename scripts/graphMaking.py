@@ -1,46 +1,231 @@
+import json
+
 import plotly.graph_objects as go
 import plotly.express as px
 import numpy as np
 import pandas as pd
 
+from .dataCache import FigureCache
+from .featureEngineering import FLIGHT_STRETCH
+from .subjectIndex import load_subject_index
+from .trajectories import trajectory_curves
+
+# Render modes: one trace per astronaut, or median + IQR/min-max ribbons
+RENDER_MODES = ["traces", "aggregate"]
+
+# Above this many plotted subjects per analyte, traces switch to WebGL (Scattergl)
+WEBGL_SUBJECT_THRESHOLD = 50
+
+# Built figures, shared by the dashboard and run_pipeline within a process
+FIGURE_CACHE = FigureCache(maxsize=128)
+
+
+def _figure_dict(fig: go.Figure) -> dict:
+    """Plain (JSON-parsed) dict of a figure: what FIGURE_CACHE stores and hands out."""
+    return json.loads(fig.to_json())
+
+
+def chart_figure(fig: dict) -> go.Figure:
+    """
+    go.Figure around a cached figure dict for st.plotly_chart, without
+    re-validating it: plotly_chart rebuilds and validates plain dicts, which
+    costs about as much as a cache miss saves.
+    """
+    return go.Figure(fig, _validate=False)
+
+# Layout objects are built as plain dicts and assigned to the figure in one
+# batch; fig.add_hline / add_hrect / add_annotation re-validate and copy the
+# whole shape list on every call.
+def _hline(y, text, position):
+    """Dotted green reference line across the plot with a right-aligned label."""
+    shape = dict(type="line", xref="x domain", x0=0, x1=1, yref="y", y0=y, y1=y,
+                 line=dict(color="green", width=2, dash="dot"))
+    label = dict(text=text, showarrow=False, xref="x domain", x=1, xanchor="right",
+                 yref="y", y=y, yanchor="top" if position == "bottom" else "bottom")
+    return shape, label
+
+
+def _hrect(y0, y1, fillcolor, opacity=0.2):
+    """Horizontal band spanning the full x range, drawn below the traces."""
+    return dict(type="rect", xref="x domain", x0=0, x1=1, yref="y", y0=y0, y1=y1,
+                fillcolor=fillcolor, opacity=opacity, layer="below", line=dict(width=0))
+
+
+def _asterisk(x, y):
+    """Red significance marker placed just above (x, y)."""
+    return dict(x=x, y=y, text="*", showarrow=False,
+                font=dict(size=20, color="red"), yshift=15)
+
+
+def _vline(x, text):
+    """Dashed vertical marker at flight day x with a label at the top."""
+    shape = dict(type="line", xref="x", x0=x, x1=x, yref="y domain", y0=0, y1=1,
+                 line=dict(color="firebrick", width=1.5, dash="dash"))
+    label = dict(text=text, showarrow=False, xref="x", x=x, xanchor="left",
+                 yref="y domain", y=1, yanchor="bottom", font=dict(color="firebrick"))
+    return shape, label
+
+
+def _flight_shapes(stretch: int = FLIGHT_STRETCH) -> list:
+    """Gray band over the stretched flight (0 to `stretch`) with dotted thirds."""
+    shapes = [dict(type="rect", xref="x", x0=0, x1=stretch, yref="y domain", y0=0, y1=1,
+                   fillcolor="LightGray", opacity=0.3, layer="below", line=dict(width=0))]
+    for day in [stretch // 3, 2 * stretch // 3]:
+        shapes.append(dict(type="line", xref="x", x0=day, x1=day, yref="y domain", y0=0, y1=1,
+                           line=dict(color="white", width=2, dash="dot"), layer="below"))
+    return shapes
+
+
+def _on_subplot(traces: list, items: list, col: int):
+    """Move traces and shape/annotation dicts built for the first axes onto subplot `col` (1-based)."""
+    if col == 1:
+        return
+    for trace in traces:
+        trace.update(xaxis=f"x{col}", yaxis=f"y{col}")
+    for item in items:
+        for ref in ("xref", "yref"):
+            if item.get(ref, "paper") != "paper":
+                item[ref] = item[ref][0] + str(col) + item[ref][1:]  # "x domain" -> "x2 domain"
+
+
+def _aggregate_traces(subdf: pd.DataFrame, analyte: str) -> list:
+    """
+    Median line plus IQR and min-max ribbons per flight day for one analyte.
+    Quantiles are computed in one groupby, so the output has a fixed number of
+    traces and one point per flight day regardless of cohort size.
+    """
+    grp = subdf.dropna(subset=["value"]).groupby("flight_day")
+    if not len(grp):
+        return []
+    summary = grp["value"].quantile([0.0, 0.25, 0.5, 0.75, 1.0]).unstack()
+    days = summary.index.to_numpy()
+    labels = grp["timepoint"].first().reindex(summary.index).to_numpy()
+    n = grp["value"].count().reindex(summary.index).to_numpy()
+
+    def ribbon(lower, upper, name, opacity):
+        return go.Scatter(
+            x=np.concatenate([days, days[::-1]]),
+            y=np.concatenate([summary[upper].to_numpy(), summary[lower].to_numpy()[::-1]]),
+            fill="toself", fillcolor=f"rgba(102,194,165,{opacity})",
+            line=dict(width=0), hoverinfo="skip", name=f"{name} ({analyte})"
+        )
+
+    return [
+        ribbon(0.0, 1.0, "Min–Max", 0.15),
+        ribbon(0.25, 0.75, "IQR", 0.35),
+        go.Scatter(
+            x=days, y=summary[0.5].to_numpy(),
+            mode="lines+markers", name=f"Median ({analyte})",
+            customdata=n, hovertext=labels,
+            hovertemplate="Day %{hovertext}<br>Median %{y}<br>n=%{customdata}<extra></extra>",
+            line=dict(color="rgb(102,194,165)"), marker=dict(color="rgb(102,194,165)")
+        ),
+    ]
+
+
+def _index_stats(stats_df: pd.DataFrame, kind: str = "test_type") -> dict:
+    """Group stats rows once: (analyte, row[kind]) -> list of row dicts."""
+    index = {}
+    if stats_df is None or stats_df.empty:
+        return index
+    for row in stats_df.to_dict("records"):
+        index.setdefault((row["analyte"], row[kind]), []).append(row)
+    return index
+
+
 def make_figure(
     tidy_df: pd.DataFrame,
     stats_df: pd.DataFrame,
     analytes: list,
     astronaut_filter=None,
-    show_error: str = None
+    show_error: str = None,
+    render_mode: str = "traces",
+    webgl_threshold: int = WEBGL_SUBJECT_THRESHOLD,
+    contrast_df: pd.DataFrame = None,
+    contrast: str = None,
+    trajectory_df: pd.DataFrame = None,
+    side_by_side: bool = False,
+    stretch: int = FLIGHT_STRETCH
 ):
     """
     Build interactive mission-day plots with stats overlays.
+    `astronaut_filter`: None (everyone), a list of astronaut IDs, or a sex as
+    recorded in the ISA study table (see subjectIndex).
+    `render_mode`:
+      - "traces"    -> one line per astronaut; drawn with WebGL once more than
+                       `webgl_threshold` astronauts are plotted
+      - "aggregate" -> median line with IQR and min-max ribbons per flight day,
+                       so the figure size does not grow with the cohort
+                       (per-astronaut "within" bands are skipped in this mode)
+    `contrast` names a contrast in `contrast_df` (contrasts.analyze_contrasts
+    output) to annotate: a marker at its target day with the group difference
+    and p-value, plus an asterisk per astronaut with a significant within test
+    (traces mode only).
+    `trajectory_df` (trajectories.fit_trajectories output) overlays the fitted
+    recovery curves: dashed per plotted astronaut (traces mode) and the pooled fit.
+    `side_by_side` draws each analyte in its own subplot (titled with its
+    panel when tidy_df has a `panel` column, see panelStore) instead of
+    overlaying them on one axis.
+    `stretch` is the flight day R+0 sits at in tidy_df (see
+    featureEngineering.parse_timepoint); it places the flight band, the R+1
+    asterisks, the tick labels and the trajectory curves.
     """
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"render_mode must be one of {RENDER_MODES}, got {render_mode!r}")
 
     fig = go.Figure()
+    traces, shapes, annotations = [], [], []
 
-    # Highlight stretched space interval (0 to 30 days)
-    fig.add_vrect(x0=0, x1=30, fillcolor="LightGray", opacity=0.3,
-                  layer="below", line_width=0)
-    for day in [10, 20]:
-        fig.add_vline(x=day, line=dict(color="white", width=2, dash="dot"),
-                      layer="below")
+    # Highlight stretched space interval (0 to `stretch` days); per subplot when side by side
+    side_by_side = side_by_side and len(analytes) > 1
+    if not side_by_side:
+        shapes.extend(_flight_shapes(stretch))
 
-    df = tidy_df.copy()
+    df = tidy_df
 
     # Apply participant filter
     if astronaut_filter is None:
         pass  # show all
-    elif isinstance(astronaut_filter, str) and astronaut_filter in ["Male", "Female"]:
-        if "sex" in df.columns:
-            df = df[df["sex"] == astronaut_filter]
+    elif isinstance(astronaut_filter, str):
+        # a sex; joined from the subject index when tidy_df has no sex column
+        sexes = df["sex"] if "sex" in df.columns else load_subject_index().sex_for(df["astronautID"])
+        df = df[np.asarray(sexes == astronaut_filter)]
     elif isinstance(astronaut_filter, (list, tuple, set)):
         df = df[df["astronautID"].isin(astronaut_filter)]
 
+    # Stats rows indexed once by (analyte, test_type)
+    stats_index = _index_stats(stats_df)
+    contrast_index = {}
+    if contrast is not None and contrast_df is not None:
+        contrast_index = _index_stats(contrast_df[contrast_df["contrast"] == contrast])
+    trajectory_index = _index_stats(trajectory_df, kind="fit_type")
+
+    # One subplot per analyte that has data, titled "analyte (panel)"
+    axis = {}
+    if side_by_side:
+        from plotly.subplots import make_subplots
+
+        analytes = [a for a in analytes if (df["analyte"] == a).any()] or analytes[:1]
+        titles = []
+        for analyte in analytes:
+            panel = df.loc[df["analyte"] == analyte, "panel"] if "panel" in df.columns else []
+            titles.append(f"{analyte.title()} ({panel.iloc[0]})" if len(panel) else analyte.title())
+        fig = make_subplots(rows=1, cols=len(analytes), subplot_titles=titles, horizontal_spacing=0.06)
+        annotations = [a.to_plotly_json() for a in fig.layout.annotations]
+
     # Loop analytes requested
-    for analyte in analytes:
+    for col, analyte in enumerate(analytes, start=1):
         subdf = df[df["analyte"] == analyte]
         if subdf.empty:
             print(f"[make_figure] Skipping {analyte} – no data")
             continue
 
+        ## Everything added in this iteration is moved onto the analyte's subplot at the end
+        first_trace, first_shape, first_annotation = len(traces), len(shapes), len(annotations)
+        if side_by_side:
+            axis = dict(row=1, col=col)
+            shapes.extend(_flight_shapes(stretch))
+
         ## Y-axis scaling
         ref_min = subdf["min"].dropna().min()
         ref_max = subdf["max"].dropna().max()
@@ -55,19 +240,13 @@ def make_figure(
 
         ## Add healthy range lines from min / max
         if pd.notna(ref_min):
-            fig.add_hline(
-                y=ref_min,
-                line=dict(color="green", width=2, dash="dot"),
-                annotation_text="Min",
-                annotation_position="bottom right"
-            )
+            shape, label = _hline(ref_min, "Min", "bottom")
+            shapes.append(shape)
+            annotations.append(label)
         if pd.notna(ref_max):
-            fig.add_hline(
-                y=ref_max,
-                line=dict(color="green", width=2, dash="dot"),
-                annotation_text="Max",
-                annotation_position="top right"
-            )
+            shape, label = _hline(ref_max, "Max", "top")
+            shapes.append(shape)
+            annotations.append(label)
 
         ## Decide axis limits: must include BOTH healthy range and all data
         low_candidates = [v for v in [ref_min, data_min] if pd.notna(v)]
@@ -84,91 +263,76 @@ def make_figure(
 
         ## Apply axis update once
         if y_range:
-            fig.update_yaxes(title=y_label, range=y_range)
+            fig.update_yaxes(title=y_label, range=y_range, **axis)
         else:
-            fig.update_yaxes(title=y_label)
+            fig.update_yaxes(title=y_label, **axis)
 
         ## Plot each astronaut trace - first colors
         palette = px.colors.qualitative.Set2
+        plotted = subdf["astronautID"].unique()
         astronaut_colors = {astr: palette[i % len(palette)]
-                            for i, astr in enumerate(subdf["astronautID"].unique())}
+                            for i, astr in enumerate(plotted)}
+
+        ## Aggregated view: ribbons instead of per-astronaut traces
+        if render_mode == "aggregate":
+            traces.extend(_aggregate_traces(subdf, analyte))
 
         ## Plot each astronaut trace
-        for astronaut, adf in subdf.groupby("astronautID"):
-            if adf.empty:
-                continue
-            adf = adf.sort_values("flight_day")
-            base_color = astronaut_colors[astronaut]
+        else:
+            scatter = go.Scattergl if len(plotted) > webgl_threshold else go.Scatter
+            for astronaut, adf in subdf.groupby("astronautID", observed=True):
+                if adf.empty:
+                    continue
+                adf = adf.sort_values("flight_day")
+                base_color = astronaut_colors[astronaut]
+
+                ### Skip if astronaut not in filter
+                if isinstance(astronaut_filter, (list, tuple, set)) and astronaut not in astronaut_filter:
+                    continue
+
+                # Main Scatter Plot
+                traces.append(scatter(
+                    x=adf["flight_day"],
+                    y=adf["value"],
+                    mode="lines+markers",
+                    name=f"{astronaut} ({analyte})",
+                    hovertext=adf["timepoint"],
+                    hovertemplate="Day %{hovertext}<br>Value %{y}<extra></extra>",
+                    line=dict(color=base_color),
+                    marker=dict(color=base_color)
+                ))
+
+        ## Within-astronaut error bands: one band (and asterisk) per plotted astronaut
+        if show_error == "within" and render_mode == "traces":
+            plotted_set = set(plotted)
+            for row in stats_index.get((analyte, "within"), []):
+                astronaut = row["astronautID"]
+                if astronaut not in plotted_set:
+                    continue  # skip astronauts not in this analyte subset
 
-            ### Skip if astronaut not in filter
-            if isinstance(astronaut_filter, (list, tuple, set)) and astronaut not in astronaut_filter:
-                continue
+                mean_L = row.get("mean_L", np.nan)
+                se = row.get("se_L", np.nan)
+                R1 = row.get("R1", np.nan)
 
-            # Main Scatter Plot
-            fig.add_trace(go.Scatter(
-                x=adf["flight_day"],
-                y=adf["value"],
-                mode="lines+markers",
-                name=f"{astronaut} ({analyte})",
-                hovertext=adf["timepoint"],
-                hovertemplate="Day %{hovertext}<br>Value %{y}<extra></extra>",
-                line=dict(color=base_color),
-                marker=dict(color=base_color)
-            ))
-
-            ### Within-astronaut error band
-            if show_error == "within" and not stats_df.empty:
-                stat_rows = stats_df[
-                    (stats_df["analyte"] == analyte)
-                    & (stats_df["test_type"] == "within")
-                    ]
-
-                for _, row in stat_rows.iterrows():
-                    astronaut = row["astronautID"]
-                    if astronaut not in subdf["astronautID"].unique():
-                        continue  # skip astronauts not in this analyte subset
-
-                    mean_L = row.get("mean_L", np.nan)
-                    se = row.get("se_L", np.nan)
-                    R1 = row.get("R1", np.nan)
-
-                    if pd.isna(mean_L) or pd.isna(se):
-                        continue
-
-                    base_color = astronaut_colors.get(astronaut, "gray")
-                    if base_color.startswith("rgb"):
-                        fill_color = base_color.replace("rgb", "rgba").replace(")", ",0.15)")
-                    else:
-                        fill_color = base_color
-
-                    #### Horizontal band: L +/- SE
-                    fig.add_hrect(
-                        y0=mean_L - se, y1=mean_L + se,
-                        fillcolor=fill_color,
-                        opacity=0.2,
-                        line_width=0,
-                        layer="below"
-                    )
-
-                    #### Asterisk if R+1 outside band
-                    if pd.notna(R1) and (R1 < mean_L - se or R1 > mean_L + se):
-                        fig.add_annotation(
-                            x=31,
-                            y=R1,
-                            text="*",
-                            showarrow=False,
-                            font=dict(size=20, color="red"),
-                            yshift=15
-                        )
+                if pd.isna(mean_L) or pd.isna(se):
+                    continue
 
-        ## Group-level error band
-        if show_error == "group" and not stats_df.empty:
-            stat_rows = stats_df[
-                (stats_df["analyte"] == analyte)
-                & (stats_df["test_type"] == "group")
-                ]
+                base_color = astronaut_colors.get(astronaut, "gray")
+                if base_color.startswith("rgb"):
+                    fill_color = base_color.replace("rgb", "rgba").replace(")", ",0.15)")
+                else:
+                    fill_color = base_color
 
-            for _, row in stat_rows.iterrows():
+                #### Horizontal band: L +/- SE
+                shapes.append(_hrect(mean_L - se, mean_L + se, fill_color))
+
+                #### Asterisk if R+1 outside band
+                if pd.notna(R1) and (R1 < mean_L - se or R1 > mean_L + se):
+                    annotations.append(_asterisk(stretch + 1, R1))
+
+        ## Group-level error band
+        if show_error == "group":
+            for row in stats_index.get((analyte, "group"), []):
                 mean_L = row.get("mean_L", np.nan)
                 n = row.get("n_L", 0)
 
@@ -180,45 +344,79 @@ def make_figure(
 
                 #### Filter bands only if stats_df has group info
                 should_plot = True
-                if "group" in row.index and astronaut_filter is not None:
+                if "group" in row and astronaut_filter is not None:
                     group_id = row["group"]
 
-                    if isinstance(astronaut_filter, str) and astronaut_filter in ["Male", "Female"]:
+                    if isinstance(astronaut_filter, str):
                         should_plot = (group_id == astronaut_filter)
                     elif isinstance(astronaut_filter, (list, tuple, set)):
                         # Only show if group_id matches one of the selected astronauts
                         should_plot = (group_id in astronaut_filter)
 
                 if should_plot and pd.notna(mean_L):
-                    fig.add_hrect(
-                        y0=mean_L - error, y1=mean_L + error,
-                        fillcolor="gray", opacity=0.2,
-                        layer="below", line_width=0,
-                        annotation_text = "Group Error Band",
-                        annotation_position="top left"
-                    )
+                    shapes.append(_hrect(mean_L - error, mean_L + error, "gray"))
+                    annotations.append(dict(text="Group Error Band", showarrow=False,
+                                            xref="x domain", x=0, xanchor="left",
+                                            yref="y", y=mean_L + error, yanchor="top"))
 
                     if row.get("p_value") is not None and row["p_value"] < 0.05:
-                        fig.add_annotation(
-                            x=31,  # R+1 = 31
-                            y=row.get("R1", mean_L),
-                            text="*",
-                            showarrow=False,
-                            font=dict(size=20, color="red"),
-                            yshift=15
-                        )
+                        annotations.append(_asterisk(stretch + 1, row.get("R1", mean_L)))  # R+1
+
+        ## Selected contrast: target-day marker with the group result
+        for row in contrast_index.get((analyte, "group"), []):
+            if pd.isna(row["target_day"]):
+                continue
+            text = f"{contrast}: Δ={row['mean_target'] - row['mean_base']:+.2f}"
+            if pd.notna(row["p_value"]):
+                text += f", p={row['p_value']:.3g}" + ("*" if row["p_value"] < 0.05 else "")
+            shape, label = _vline(row["target_day"], text)
+            shapes.append(shape)
+            annotations.append(label)
+
+        if render_mode == "traces":
+            plotted_set = set(plotted)
+            for row in contrast_index.get((analyte, "within"), []):
+                if (row["astronautID"] in plotted_set and pd.notna(row["p_value"])
+                        and row["p_value"] < 0.05 and pd.notna(row["target_day"])):
+                    annotations.append(_asterisk(row["target_day"], row["mean_target"]))
+
+        ## Fitted recovery trajectories
+        fit_rows = list(trajectory_index.get((analyte, "pooled"), []))
+        if render_mode == "traces":
+            fit_rows += [row for row in trajectory_index.get((analyte, "astronaut"), [])
+                         if row["astronautID"] in astronaut_colors]
+        if fit_rows:
+            curves = trajectory_curves(pd.DataFrame(fit_rows), stretch=stretch)
+            for (astronaut, fit_type), cdf in curves.groupby(["astronautID", "fit_type"], sort=False):
+                pooled = fit_type == "pooled"
+                color = "black" if pooled else astronaut_colors[astronaut]
+                traces.append(go.Scatter(
+                    x=cdf["flight_day"],
+                    y=cdf["fitted"],
+                    mode="lines",
+                    name=f"{'Pooled' if pooled else astronaut} fit ({analyte})",
+                    hoverinfo="skip",
+                    line=dict(color=color, dash="dash", width=3 if pooled else 1.5)
+                ))
 
         ## Only update range if ref_min/ref_max are valid
         if pd.notna(ref_min) and pd.notna(ref_max):
             fig.update_yaxes(title=y_label,
-                             range=[ref_min * 0.9, ref_max * 1.1])
+                             range=[ref_min * 0.9, ref_max * 1.1], **axis)
         else:
-            fig.update_yaxes(title=y_label)
+            fig.update_yaxes(title=y_label, **axis)
+
+        if side_by_side:
+            _on_subplot(traces[first_trace:], shapes[first_shape:] + annotations[first_annotation:], col)
+
+    # Assign traces, shapes and annotations in one batch each
+    fig.add_traces(traces)
+    fig.update_layout(shapes=shapes, annotations=annotations)
 
     # Layout: Build Dynamic Title
     if astronaut_filter is None:
         group_label = "All Participants"
-    elif isinstance(astronaut_filter, str) and astronaut_filter in ["Male", "Female"]:
+    elif isinstance(astronaut_filter, str):
         group_label = f"{astronaut_filter} Participants"
     elif isinstance(astronaut_filter, (list, tuple, set)):
         group_label = "Subset: " + ", ".join(astronaut_filter)
@@ -229,7 +427,7 @@ def make_figure(
     ana_label = ", ".join(analytes)
     unit_label = ""
     subdf = df[df["analyte"] == analytes[0]]
-    if "unit" in subdf.columns and not subdf["unit"].dropna().empty:
+    if not side_by_side and "unit" in subdf.columns and not subdf["unit"].dropna().empty:
         unit_label = f" ({subdf['unit'].dropna().iloc[0]})"
 
     fig.update_layout(
@@ -245,12 +443,114 @@ def make_figure(
     ticks = [t for t in sorted(df["flight_day"].dropna().unique()) if pd.notna(t)]
     ticktext = []
     for t in ticks:
-        if t >= 30:
-            lbl = f"R+{int(t-30)}"
+        if t >= stretch:
+            lbl = f"R+{int(t-stretch)}"
         else:
             lbl = f"L{int(t)}"
         ticktext.append(lbl)
     if ticks:
         fig.update_xaxes(tickmode="array", tickvals=ticks, ticktext=ticktext)
 
-    return fig
\ No newline at end of file
+    return fig
+
+
+def cached_figure(
+    dataset_digest: str,
+    tidy_df: pd.DataFrame,
+    stats_df: pd.DataFrame,
+    analytes: list,
+    astronaut_filter=None,
+    show_error: str = None,
+    render_mode: str = "traces",
+    webgl_threshold: int = WEBGL_SUBJECT_THRESHOLD,
+    contrast_df: pd.DataFrame = None,
+    contrast: str = None,
+    trajectory_df: pd.DataFrame = None,
+    side_by_side: bool = False,
+    stretch: int = FLIGHT_STRETCH
+):
+    """
+    make_figure served from FIGURE_CACHE, as a plotly figure dict.
+    `dataset_digest` is the content hash of the file tidy_df/stats_df (and
+    contrast_df/trajectory_df) came from (see dataCache.file_signature); together with the
+    plot parameters it keys the cached figure.
+    A hit returns the cached dict as is, without building a go.Figure; it is
+    shared: pass it to pio.write_html / pio.show (validate=False) as is or
+    through chart_figure to st.plotly_chart, and wrap it in go.Figure(fig)
+    before changing it.
+    """
+    if isinstance(astronaut_filter, (list, tuple, set)):
+        filter_key = ("ids",) + tuple(astronaut_filter if not isinstance(astronaut_filter, set)
+                                      else sorted(astronaut_filter))
+    else:
+        filter_key = astronaut_filter
+    if contrast_df is None:
+        contrast = None
+    # fits for one dataset differ only by their polynomial degree
+    trajectory_key = None if trajectory_df is None else tuple(sorted(trajectory_df["degree"].unique().tolist()))
+    key = (dataset_digest, tuple(analytes), filter_key, show_error, render_mode, webgl_threshold,
+           contrast, trajectory_key, side_by_side, stretch)
+
+    return FIGURE_CACHE.get_or_build(key, lambda: _figure_dict(make_figure(
+        tidy_df=tidy_df,
+        stats_df=stats_df,
+        analytes=analytes,
+        astronaut_filter=astronaut_filter,
+        show_error=show_error,
+        render_mode=render_mode,
+        webgl_threshold=webgl_threshold,
+        contrast_df=contrast_df,
+        contrast=contrast,
+        trajectory_df=trajectory_df,
+        side_by_side=side_by_side,
+        stretch=stretch
+    )))
+
+
+# Above this many analytes the heatmap drops its tick labels (names stay in the hover)
+HEATMAP_LABEL_LIMIT = 60
+
+
+def make_correlation_heatmap(corr: pd.DataFrame, title: str = "Analyte Correlations"):
+    """
+    Heatmap of an analyte x analyte correlation frame (e.g.
+    correlations.clustered_correlations). One Heatmap trace with float32
+    values keeps the figure light for hundreds of analytes.
+    """
+    names = [str(a) for a in corr.columns]
+    labels = len(names) <= HEATMAP_LABEL_LIMIT
+    fig = go.Figure(go.Heatmap(
+        z=corr.to_numpy(dtype=np.float32),
+        x=names, y=names,
+        zmin=-1, zmax=1, zmid=0, colorscale="RdBu_r",
+        colorbar=dict(title="r"),
+        hovertemplate="%{y} / %{x}<br>r=%{z}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=title,
+        template="plotly_white",
+        height=max(450, min(900, 12 * len(names))),
+        margin=dict(l=60, r=30, t=60, b=60)
+    )
+    fig.update_xaxes(showticklabels=labels, tickangle=-45)
+    fig.update_yaxes(showticklabels=labels, autorange="reversed", scaleanchor="x")
+    return fig
+
+
+def cached_correlation_heatmap(dataset_digest: str, tidy_df,
+                               method: str = "pearson", phase: str = None):
+    """
+    Clustered correlation heatmap served from FIGURE_CACHE as a shared plotly
+    figure dict (see cached_figure); the correlation matrix and clustering
+    are only computed on a miss.
+    `tidy_df` is a tidy frame or a ValueCube; `dataset_digest` is the
+    content hash of the file it came from.
+    """
+    from .correlations import clustered_correlations
+
+    phase_label = {None: "All Timepoints", "L": "Pre-flight", "R": "Recovery"}[phase]
+    key = ("correlation", dataset_digest, method, phase)
+    return FIGURE_CACHE.get_or_build(key, lambda: _figure_dict(make_correlation_heatmap(
+        clustered_correlations(tidy_df, method=method, phase=phase),
+        title=f"{method.title()} Correlations ({phase_label})"
+    )))
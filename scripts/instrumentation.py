@@ -0,0 +1,142 @@
+"""
+Lightweight per-stage instrumentation for the pipeline.
+
+Wrap a stage in `profiler.stage(name)` to record its wall time, peak traced
+memory and the row/column count of its output as one JSON record:
+
+    {"run": "...", "seq": 3, "stage": "tidy_from_wide", "parent": "load_or_build",
+     "depth": 1, "rows": 8760, "columns": 10, "seconds": 0.021, "peak_mb": 3.4}
+
+Profiling is off unless enabled explicitly or via PIPELINE_PROFILE:
+    PIPELINE_PROFILE=1            records go to stderr
+    PIPELINE_PROFILE=perf.jsonl   records are appended to that file
+A disabled profiler's stages are no-ops, so call sites never need to check.
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+PROFILE_ENV = "PIPELINE_PROFILE"
+_STDERR_VALUES = {"1", "true", "yes", "on", "-", "stderr"}
+
+
+def profile_target(value=None):
+    """
+    Resolve a PIPELINE_PROFILE-style value (default: the environment) to a sink:
+    None (disabled), "-" (stderr) or a file path.
+    """
+    if value is None:
+        value = os.environ.get(PROFILE_ENV, "")
+    value = str(value).strip()
+    if value.lower() in {"", "0", "false", "no", "off"}:
+        return None
+    return "-" if value.lower() in _STDERR_VALUES else value
+
+
+class _Stage:
+    """Handle yielded by StageProfiler.stage(); attach output sizes and extra fields."""
+
+    __slots__ = ("fields", "child_peak")
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.child_peak = 0
+
+    def note(self, df=None, **fields):
+        """Record rows/columns of `df` (anything with .shape or len()) plus extra fields."""
+        if df is not None:
+            shape = getattr(df, "shape", None)
+            if shape is not None:
+                self.fields["rows"] = int(shape[0])
+                if len(shape) > 1:
+                    self.fields["columns"] = int(shape[1])
+            else:
+                self.fields["rows"] = len(df)
+        self.fields.update(fields)
+
+
+class StageProfiler:
+    """
+    Collects one record per stage for a single run (a CLI call or one dashboard rerun).
+    `target` is "-" for stderr, a file path for JSON lines, or None to keep
+    records in memory only; `enabled` defaults to PIPELINE_PROFILE being set.
+    """
+
+    def __init__(self, enabled=None, target=None, trace_memory=True):
+        if enabled is None:
+            target = target or profile_target()
+            enabled = target is not None
+        self.enabled = enabled
+        self.target = target if enabled else None
+        self.trace_memory = trace_memory
+        self.run = uuid.uuid4().hex[:12]
+        self.records = []
+        self._stack = []
+        self._seq = 0
+        self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name, **fields):
+        if not self.enabled:
+            yield _Stage({})
+            return
+
+        parent = self._stack[-1] if self._stack else None
+        handle = _Stage({"run": self.run, "seq": self._seq, "stage": name,
+                         "parent": parent.fields["stage"] if parent else None,
+                         "depth": len(self._stack), **fields})
+        self._seq += 1
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if parent is not None:
+                # Keep the parent's peak before resetting the counter for this stage
+                parent.child_peak = max(parent.child_peak, tracemalloc.get_traced_memory()[1])
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        self._stack.append(handle)
+        start = time.perf_counter()
+        try:
+            yield handle
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            record = handle.fields
+            record["seconds"] = round(elapsed, 6)
+            if self.trace_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], handle.child_peak)
+                record["peak_mb"] = round(max(peak - baseline, 0) / 2**20, 3)
+                if parent is not None:
+                    parent.child_peak = max(parent.child_peak, peak)
+                elif self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+            self.records.append(record)
+            self._emit(record)
+
+    def _emit(self, record):
+        if self.target is None:
+            return
+        line = json.dumps(record, default=str)
+        if self.target == "-":
+            print(line, file=sys.stderr)
+        else:
+            with open(self.target, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+
+    def summary(self):
+        """Records as a DataFrame in the order the stages started."""
+        import pandas as pd
+
+        return pd.DataFrame(sorted(self.records, key=lambda r: r["seq"]))
+
+
+# Shared disabled profiler for call sites that weren't handed one
+NULL_PROFILER = StageProfiler(enabled=False)
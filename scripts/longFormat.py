@@ -0,0 +1,261 @@
+"""
+Streaming ingestion of long-format SUBMITTED panels.
+
+Raw uploads in data/ carry one measurement per row, e.g.
+    Analyte,Concentration,Timepoint,ID,Unit,Timepoint2,Type,Percent        (Eve panels)
+    ANALYTE,VALUE,RANGE_MIN,RANGE_MAX,UNITS,TEST_TYPE,SUBJECT_ID,SEX,timepoint   (CMP)
+These are read in bounded-size chunks and each chunk is mapped straight onto
+the tidy schema used by analyze_r1_vs_L and make_figure, without going
+through the wide _TRANSFORMED layout.
+
+Excel uploads (the Alamar panel .xlsx, same columns as the Eve panels) are
+streamed row by row with openpyxl in read-only mode, so the workbook is never
+loaded whole; the chunks then go through the same normalization. The tidy
+frame is cached as Feather by artifactStore, keyed on the workbook hash, so a
+workbook is only parsed again after it changes.
+"""
+import os
+import re
+import zipfile
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from .featureEngineering import FLIGHT_STRETCH, parse_timepoints
+from .stats import ANALYTE_INFO, TIDY_COLUMNS, compact_tidy, concat_tidy
+from .subjectIndex import load_subject_index
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Lowercased source header -> tidy column
+LONG_COLUMN_MAP = {
+    "analyte": "analyte",
+    "concentration": "value",
+    "value": "value",
+    "timepoint": "timepoint",
+    "id": "astronautID",
+    "subject_id": "astronautID",
+    "astronautid": "astronautID",
+    "unit": "unit",
+    "units": "unit",
+    "range_min": "min",
+    "range_max": "max",
+    "sex": "sex",
+}
+REQUIRED_COLUMNS = ["analyte", "value", "timepoint", "astronautID"]
+
+# Source analyte names that don't normalize to their ANALYTE_INFO key
+ANALYTE_ALIASES = {
+    "a-2 macroglobulin": "a2_macroglobulin",
+    "bilirubin; total": "total_bilirubin",
+    "protein; total": "total_protein",
+    "egfr non-afr. american": "egfr_non_african_american",
+}
+
+SEX_CODES = {"M": "Male", "MALE": "Male", "F": "Female", "FEMALE": "Female"}
+
+WORKBOOK_SUFFIXES = (".xlsx", ".xlsm")
+
+
+def normalize_analyte_name(name: str) -> str:
+    """
+    Map a source analyte name onto the snake_case keys used in ANALYTE_INFO,
+    e.g. 'UREA NITROGEN (BUN)' -> 'urea_nitrogen_bun', 'BUN/CREATININE RATIO'
+    -> 'bun_to_creatinine_ratio'.
+    """
+    key = str(name).strip().lower()
+    if key in ANALYTE_ALIASES:
+        return ANALYTE_ALIASES[key]
+    key = key.replace("/", " to ")
+    return re.sub(r"[^\w]+", "_", key).strip("_")
+
+
+def resolve_long_columns(columns) -> dict:
+    """
+    Return {source column: tidy column} for a long-format header.
+    Raises KeyError if analyte, value, timepoint or subject ID can't be found.
+    """
+    mapping = {}
+    for col in columns:
+        target = LONG_COLUMN_MAP.get(str(col).strip().lstrip("\ufeff").lower())
+        if target is not None and target not in mapping.values():
+            mapping[col] = target
+    missing = [c for c in REQUIRED_COLUMNS if c not in mapping.values()]
+    if missing:
+        raise KeyError(f"Long-format file is missing columns for: {', '.join(missing)}")
+    return mapping
+
+
+def normalize_long_chunk(chunk: pd.DataFrame, colmap: dict,
+                         registered_only: bool = False,
+                         stretch: int = FLIGHT_STRETCH, subjects=None) -> pd.DataFrame:
+    """
+    Convert one chunk of a long-format panel into tidy rows.
+    Labels, units and manual reference ranges come from ANALYTE_INFO when the
+    analyte is registered, otherwise from the source name and Unit column.
+    Sex comes from a Sex column when there is one, else from `subjects`
+    (default: subjectIndex.load_subject_index()).
+    """
+    df = chunk[list(colmap)].rename(columns=colmap)
+
+    # Normalize each distinct analyte / timepoint once per chunk
+    raw_analytes = df["analyte"].astype(str)
+    names = {a: normalize_analyte_name(a) for a in raw_analytes.unique()}
+    analytes = raw_analytes.map(names)
+    if registered_only:
+        keep = analytes.isin(ANALYTE_INFO.keys())
+        df, raw_analytes, analytes = df[keep], raw_analytes[keep], analytes[keep]
+
+    timepoints = df["timepoint"].astype(str).str.strip()
+    flight_days = parse_timepoints(timepoints, stretch)
+    astronauts = df["astronautID"].astype(str).str.strip()
+
+    # Per-analyte metadata resolved once for the distinct analytes in the chunk
+    info = pd.DataFrame(
+        [ANALYTE_INFO.get(a, {}) for a in analytes.unique()],
+        index=analytes.unique(), columns=["label", "unit", "min", "max"],
+    )
+    labels = analytes.map(info["label"]).fillna(raw_analytes.str.strip())
+    units = analytes.map(info["unit"])
+    if "unit" in df.columns:
+        units = units.fillna(df["unit"])
+
+    mins = pd.to_numeric(df["min"], errors="coerce") if "min" in df.columns \
+        else pd.Series(np.nan, index=df.index)
+    maxs = pd.to_numeric(df["max"], errors="coerce") if "max" in df.columns \
+        else pd.Series(np.nan, index=df.index)
+    mins = mins.fillna(analytes.map(info["min"]))
+    maxs = maxs.fillna(analytes.map(info["max"]))
+
+    if "sex" in df.columns:
+        sexes = df["sex"].astype(str).str.strip().str.upper().map(SEX_CODES)
+    else:
+        sexes = pd.Series(np.nan, index=df.index, dtype=object)
+    subjects = load_subject_index() if subjects is None else subjects
+    sexes = sexes.fillna(pd.Series(subjects.sex_for(astronauts), index=df.index).astype(object))
+
+    return compact_tidy(pd.DataFrame({
+        "astronautID": astronauts.to_numpy(),
+        "timepoint": timepoints.to_numpy(),
+        "flight_day": flight_days,
+        "analyte": analytes.to_numpy(),
+        "value": pd.to_numeric(df["value"], errors="coerce").to_numpy(dtype=float),
+        "min": mins.to_numpy(dtype=float),
+        "max": maxs.to_numpy(dtype=float),
+        "label": labels.to_numpy(),
+        "unit": units.to_numpy(),
+        "sex": sexes.to_numpy(),
+    }, columns=TIDY_COLUMNS))
+
+
+def is_workbook(path: str) -> bool:
+    return path.lower().endswith(WORKBOOK_SUFFIXES)
+
+
+def _sheet_header(row) -> list:
+    """Column names for a sheet's first row (blank cells get placeholder names)."""
+    return [f"column_{i}" if v is None else str(v) for i, v in enumerate(row)]
+
+
+def _open_long_sheet(path: str):
+    """
+    (workbook, row iterator positioned after the header, header) for the first
+    sheet of `path` with a long-format header. Raises KeyError if there is none.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    for sheet in workbook.worksheets:
+        rows = sheet.iter_rows(values_only=True)
+        header = _sheet_header(next(rows, ()))
+        try:
+            resolve_long_columns(header)
+        except KeyError:
+            continue
+        return workbook, rows, header
+    workbook.close()
+    raise KeyError(f"No sheet in {os.path.basename(path)} has a long-format header")
+
+
+def iter_workbook_chunks(path: str, chunksize: int = DEFAULT_CHUNKSIZE):
+    """
+    Yield DataFrames of up to `chunksize` rows from the long-format sheet of an
+    Excel workbook, streamed in openpyxl read-only mode. Blank rows are skipped.
+    """
+    workbook, rows, header = _open_long_sheet(path)
+    try:
+        rows = (row for row in rows if any(v is not None for v in row))
+        while batch := list(islice(rows, chunksize)):
+            yield pd.DataFrame.from_records(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def iter_long_tidy(path: str, chunksize: int = DEFAULT_CHUNKSIZE,
+                   registered_only: bool = False, stretch: int = FLIGHT_STRETCH):
+    """
+    Yield tidy frames for successive chunks of a long-format CSV or workbook.
+    Only `chunksize` source rows are held in memory at a time.
+    """
+    chunks = iter_workbook_chunks(path, chunksize) if is_workbook(path) \
+        else pd.read_csv(path, chunksize=chunksize, encoding="utf-8-sig")
+    colmap = None
+    for chunk in chunks:
+        if colmap is None:
+            colmap = resolve_long_columns(chunk.columns)
+        tidy = normalize_long_chunk(chunk, colmap, registered_only=registered_only, stretch=stretch)
+        if not tidy.empty:
+            yield tidy
+
+
+def read_long_tidy(path: str, chunksize: int = DEFAULT_CHUNKSIZE,
+                   registered_only: bool = False, stretch: int = FLIGHT_STRETCH) -> pd.DataFrame:
+    """
+    Stream a long-format SUBMITTED CSV or workbook into one tidy frame ready for
+    analyze_r1_vs_L / make_figure. Chunks are joined with their categories
+    unioned, so the result stays compact.
+    """
+    return concat_tidy(iter_long_tidy(path, chunksize=chunksize,
+                                      registered_only=registered_only, stretch=stretch))
+
+
+@lru_cache(maxsize=64)
+def _is_long_workbook(path: str, mtime_ns: int, size: int) -> bool:
+    """
+    True if a workbook has a long-format sheet.
+    Memoized on (path, mtime, size): opening a workbook reads its shared strings.
+    """
+    try:
+        workbook, _, _ = _open_long_sheet(path)
+    except (KeyError, OSError, ValueError, zipfile.BadZipFile):
+        return False
+    workbook.close()
+    return True
+
+
+def is_long_format(path: str) -> bool:
+    """True if the CSV or workbook header looks like a long-format (one row per measurement) panel."""
+    if is_workbook(path):
+        st = os.stat(path)
+        return _is_long_workbook(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    try:
+        header = pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns
+        resolve_long_columns(header)
+    except (KeyError, ValueError, UnicodeDecodeError):
+        return False
+    return True
+
+
+def list_long_files(folder: str = "data", known=None) -> list:
+    """
+    Long-format CSVs and workbooks in `folder` (e.g. the *_SUBMITTED uploads).
+    Files for which `known(path)` is True are accepted without reading their header.
+    """
+    if not os.path.isdir(folder):
+        return []
+    accept = lambda path: (known is not None and known(path)) or is_long_format(path)
+    return sorted(f for f in os.listdir(folder)
+                  if f.lower().endswith((".csv",) + WORKBOOK_SUFFIXES) and not f.startswith("~$")
+                  and accept(os.path.join(folder, f)))
@@ -0,0 +1,161 @@
+"""
+Unified store of every panel's tidy rows and stats, loaded once per process.
+
+Each dataset (see artifactStore.list_datasets) is a panel: the tidy frames
+are merged into one frame keyed by (astronautID, timepoint, analyte) with a
+categorical `panel` column, and rows are kept sorted by analyte so the rows
+of any analyte subset are contiguous slices found by binary search. Analytes
+are unique across panels: when two files carry the same analyte (a wide
+final_data CSV and its long-format upload), the first panel keeps it.
+
+    store = get_panel_store()
+    store.tidy_for(["sodium", "crp", "il_6"])   # rows from three panels
+"""
+import hashlib
+import os
+import threading
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from .artifactStore import list_datasets, load_or_build
+from .dataCache import file_signature
+from .instrumentation import NULL_PROFILER
+from .stats import concat_tidy
+from .subjectIndex import load_subject_index
+from .valueCube import ValueCube, build_cube
+
+_SUFFIXES = ["_TRANSFORMED", ".upload_SUBMITTED", "_SUBMITTED"]
+
+
+def panel_name(path: str) -> str:
+    """Panel label for a dataset file: its name without extension and export suffixes."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    for suffix in _SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+
+class PanelStore:
+    """
+    Merged tidy/stats frames of several panels with analyte-indexed lookups.
+    `tidy` is sorted by (analyte, astronautID, flight_day); `stats` follows
+    the analyte order of `analytes`. Both are shared and must not be modified
+    in place.
+    """
+
+    def __init__(self, tidy: pd.DataFrame, stats: pd.DataFrame, sources: dict, digest: str):
+        self.tidy = tidy
+        self.stats = stats
+        self.sources = sources      # panel -> file path
+        self.digest = digest        # hash of the source file and ISA table hashes, for figure cache keys
+        categories = tidy["analyte"].cat.categories
+        self._codes = dict(zip(categories, range(len(categories))))
+        # rows of analyte code c are tidy[_starts[c]:_starts[c + 1]]
+        self._starts = np.searchsorted(tidy["analyte"].cat.codes.to_numpy(),
+                                       np.arange(len(categories) + 1))
+        self._stats_rows = stats.groupby("analyte", sort=False).indices
+
+    @cached_property
+    def cube(self) -> ValueCube:
+        """In-memory ValueCube of the merged tidy frame, built on first use."""
+        return build_cube(self.tidy)
+
+    @property
+    def panels(self) -> list:
+        return list(self.sources)
+
+    @property
+    def analytes(self) -> pd.DataFrame:
+        """One row per analyte: analyte, panel, unit."""
+        first = self.tidy.iloc[self._starts[:-1][np.diff(self._starts) > 0]]
+        return first[["analyte", "panel", "unit"]].astype(object).reset_index(drop=True)
+
+    def panel_of(self, analyte: str) -> str | None:
+        start = self._starts[self._codes[analyte]] if analyte in self._codes else None
+        return None if start is None or start == len(self.tidy) else self.tidy["panel"].iat[start]
+
+    def tidy_for(self, analytes) -> pd.DataFrame:
+        """Tidy rows of `analytes` (any panels), in the order given; unknown names are skipped."""
+        bounds = [(self._starts[c], self._starts[c + 1])
+                  for c in (self._codes.get(a) for a in analytes) if c is not None]
+        if not bounds:
+            return self.tidy.iloc[:0]
+        rows = np.concatenate([np.arange(lo, hi) for lo, hi in bounds])
+        return self.tidy.iloc[rows]
+
+    def stats_for(self, analytes) -> pd.DataFrame:
+        """Stats rows of `analytes`, in the order given."""
+        rows = [self._stats_rows[a] for a in analytes if a in self._stats_rows]
+        return self.stats.iloc[np.concatenate(rows)] if rows else self.stats.iloc[:0]
+
+    def lookup(self, analytes=None, astronauts=None, timepoints=None) -> pd.DataFrame:
+        """Tidy rows matching every given key list (None = no restriction)."""
+        rows = self.tidy if analytes is None else self.tidy_for(analytes)
+        for col, keys in [("astronautID", astronauts), ("timepoint", timepoints)]:
+            if keys is not None:
+                wanted = rows[col].cat.categories.get_indexer(list(keys))
+                rows = rows[np.isin(rows[col].cat.codes.to_numpy(), wanted[wanted >= 0])]
+        return rows
+
+
+def build_panel_store(paths=None, profiler=NULL_PROFILER) -> PanelStore:
+    """
+    Load every dataset in `paths` (default: list_datasets()) through the
+    artifact store and merge them into a PanelStore.
+    """
+    paths = list_datasets() if paths is None else list(paths)
+    tidy_parts, stats_parts, sources, seen = [], [], {}, set()
+    digests = hashlib.sha256()
+    digests.update(str(load_subject_index().digest).encode())
+    for path in paths:
+        with profiler.stage("load_panel", panel=panel_name(path)) as stage:
+            tidy_df, stats_df = load_or_build(path, profiler)
+            digests.update(file_signature(path)[2].encode())
+            new = ~tidy_df["analyte"].isin(seen).to_numpy()
+            tidy_df = tidy_df[new]
+            stage.note(tidy_df)
+        if tidy_df.empty:
+            continue
+        panel = panel_name(path)
+        if panel in sources:
+            panel = f"{panel} ({os.path.basename(os.path.dirname(path))})"
+        analytes = set(tidy_df["analyte"].unique())
+        seen |= analytes
+        sources[panel] = path
+        tidy_parts.append(tidy_df)
+        stats_parts.append(stats_df[stats_df["analyte"].isin(analytes)].assign(panel=panel))
+
+    with profiler.stage("merge_panels") as stage:
+        tidy = concat_tidy(tidy_parts)
+        lengths = [len(part) for part in tidy_parts]
+        tidy["panel"] = pd.Categorical.from_codes(np.repeat(np.arange(len(lengths)), lengths),
+                                                  categories=list(sources))
+        tidy = tidy.sort_values(["analyte", "astronautID", "flight_day"], kind="stable") \
+            .reset_index(drop=True)
+        stats = pd.concat(stats_parts, ignore_index=True) if stats_parts else pd.DataFrame()
+        stage.note(tidy)
+    return PanelStore(tidy, stats, sources, digests.hexdigest())
+
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_panel_store(paths=None, profiler=NULL_PROFILER) -> PanelStore:
+    """
+    PanelStore for `paths`, built once per process and rebuilt only when one
+    of the files or the ISA study table changes (keyed on their signatures).
+    """
+    paths = list_datasets() if paths is None else list(paths)
+    key = tuple(file_signature(p) for p in paths) + (load_subject_index().digest,)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+    if store is None:
+        store = build_panel_store(paths, profiler)
+        with _STORES_LOCK:
+            _STORES.clear()  # only the current file versions are kept
+            _STORES[key] = store
+    return store
@@ -0,0 +1,152 @@
+"""
+Batch export of the full figure report.
+
+Renders every analyte x {All, Male, Female, each astronaut} x error band
+combination for each dataset to standalone HTML, plus an index page and one
+consolidated stats table. The Plotly JS bundle is written once to the report
+root and referenced by every page.
+
+    python -m scripts.reportExport --out report
+"""
+import argparse
+import html
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .artifactStore import list_datasets, load_or_build
+from .subjectIndex import load_subject_index
+
+ERROR_MODES = [None, "within", "group"]
+PLOTLY_JS = "plotly.min.js"
+
+# Frames loaded by this (worker) process, keyed by dataset path
+_FRAMES = {}
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", str(text)).strip("_")
+
+
+def _frames(path: str):
+    """Tidy/stats frames for `path`, read from the artifact store once per process."""
+    if path not in _FRAMES:
+        _FRAMES[path] = load_or_build(path)
+    return _FRAMES[path]
+
+
+def _filters(tidy_df: pd.DataFrame) -> list:
+    """(label, astronaut_filter) pairs: All, each sex in the subject index, then each astronaut."""
+    filters = [("All", None)] + [(sex, sex) for sex in load_subject_index().sexes]
+    filters += [(a, [a]) for a in sorted(tidy_df["astronautID"].unique())]
+    return filters
+
+
+def _render_analyte(task):
+    """
+    Write every filter x error page for one (dataset, analyte).
+    Returns [(filter label, error label, page path relative to the report root)].
+    """
+    from .graphMaking import make_figure
+
+    path, analyte, out_dir = task
+    tidy_df, stats_df = _frames(path)
+    dataset_dir = _slug(os.path.splitext(os.path.basename(path))[0])
+    os.makedirs(os.path.join(out_dir, dataset_dir), exist_ok=True)
+
+    pages = []
+    for label, astronaut_filter in _filters(tidy_df):
+        for show_error in ERROR_MODES:
+            error_label = show_error or "none"
+            rel_path = f"{dataset_dir}/{_slug(analyte)}__{_slug(label)}__{error_label}.html"
+            fig = make_figure(
+                tidy_df=tidy_df,
+                stats_df=stats_df,
+                analytes=[analyte],
+                astronaut_filter=astronaut_filter,
+                show_error=show_error
+            )
+            fig.write_html(os.path.join(out_dir, rel_path), include_plotlyjs=f"../{PLOTLY_JS}")
+            pages.append((label, error_label, rel_path))
+    return pages
+
+
+def _write_index(out_dir: str, entries: dict):
+    """entries: dataset path -> {analyte: [(filter label, error label, rel path)]}"""
+    parts = ["<!DOCTYPE html><html><head><meta charset='utf-8'>",
+             "<title>Astronaut Biochemistry Report</title></head><body>",
+             "<h1>Astronaut Biochemistry Report</h1>",
+             "<p><a href='stats.csv'>Consolidated stats table (CSV)</a></p>"]
+    for path, analytes in entries.items():
+        parts.append(f"<h2>{html.escape(path)}</h2><table border='1' cellpadding='4'>")
+        for analyte, pages in analytes.items():
+            links = " ".join(
+                f"<a href='{html.escape(rel)}'>{html.escape(label)}/{html.escape(err)}</a>"
+                for label, err, rel in pages
+            )
+            parts.append(f"<tr><th>{html.escape(analyte)}</th><td>{links}</td></tr>")
+        parts.append("</table>")
+    parts.append("</body></html>")
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as fh:
+        fh.write("\n".join(parts))
+
+
+def export_report(out_dir: str = "report", datasets=None, workers=None) -> str:
+    """
+    Render the full report into `out_dir` and return the index page path.
+    `datasets` defaults to every final_data CSV. Frames are built (or loaded
+    from the artifact store) up front, then pages are rendered per analyte on
+    a process pool of `workers` processes (default: one per CPU).
+    """
+    from plotly.offline import get_plotlyjs
+
+    if datasets is None:
+        datasets = list_datasets(long_folder=None)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Plotly bundle written once and shared by every page
+    with open(os.path.join(out_dir, PLOTLY_JS), "w", encoding="utf-8") as fh:
+        fh.write(get_plotlyjs())
+
+    tasks, stats_tables = [], []
+    for path in datasets:
+        tidy_df, stats_df = _frames(path)  # also refreshes stale artifacts before forking
+        stats_tables.append(stats_df.assign(dataset=os.path.basename(path)))
+        tasks += [(path, analyte, out_dir) for analyte in tidy_df["analyte"].unique()]
+
+    if stats_tables:
+        stats_all = pd.concat(stats_tables, ignore_index=True)
+        stats_all = stats_all[["dataset"] + [c for c in stats_all.columns if c != "dataset"]]
+        stats_all.to_csv(os.path.join(out_dir, "stats.csv"), index=False)
+
+    if len(tasks) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_render_analyte, tasks))
+    else:
+        results = [_render_analyte(t) for t in tasks]
+
+    entries = {}
+    for (path, analyte, _), pages in zip(tasks, results):
+        entries.setdefault(path, {})[analyte] = pages
+    _write_index(out_dir, entries)
+    return os.path.join(out_dir, "index.html")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export every figure to a static HTML report.")
+    parser.add_argument("--out", default="report", help="output folder")
+    parser.add_argument("--dataset", action="append",
+                        help="dataset path (repeatable; default: every final_data CSV)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    index = export_report(args.out, datasets=args.dataset, workers=args.workers)
+    print(f"Report written to {index}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
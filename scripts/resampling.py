@@ -0,0 +1,239 @@
+"""
+Permutation and bootstrap inference for the R+1 vs L-series comparison.
+
+With four astronauts and three L-series draws each, the t-tests in
+analyze_r1_vs_L rest on very few degrees of freedom. This module adds
+distribution-free companions for every within-astronaut and group row:
+
+    perm_p              exact permutation p-value
+                          within: which of the n_L + 1 draws is R+1 (every relabeling)
+                          group:  sign flips of the per-astronaut R+1 - mean(L)
+                                  differences (all 2^n patterns; Monte Carlo above
+                                  EXACT_SIGN_FLIP_LIMIT astronauts)
+    diff_ci_low/high    bootstrap percentile CI of R+1 - mean(L)
+    d_ci_low/high       bootstrap percentile CI of Cohen's d (same convention as effect_size)
+
+Resample indices are drawn once per sample size from one seeded generator and
+applied as array operations to every analyte/astronaut at once, so results
+are reproducible for a given seed whatever the batching. Batches larger than
+MAX_BATCH_CELLS are split into chunks, which can run on a process pool.
+n_perm=0 / n_boot=0 skip the permutation tests / bootstrap (their columns are NaN).
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .stats import DEFAULT_CI, DEFAULT_N_BOOT, DEFAULT_N_PERM, DEFAULT_SEED, _label_mask
+
+# Up to 2^12 = 4096 sign patterns are enumerated exactly
+EXACT_SIGN_FLIP_LIMIT = 12
+
+# Resampled cells (rows x distinct resamples x sample size) held in memory per
+# chunk; 2^21 float64 cells are 16 MB, plus the per-resample means/SDs
+MAX_BATCH_CELLS = 2 ** 21
+
+RESAMPLE_COLUMNS = ["perm_p", "diff_ci_low", "diff_ci_high", "d_ci_low", "d_ci_high"]
+
+# Relative tolerance so statistics equal to the observed one count as extreme
+_TIE_TOL = 1e-9
+
+
+## Permutation tests
+def _within_perm_p(L: np.ndarray, R1: np.ndarray) -> np.ndarray:
+    """
+    Exact relabeling test per pair. L is pairs x K (NaN-padded), R1 is per pair.
+    Each of the n_L + 1 draws takes a turn as 'R+1'; the statistic is
+    |draw - mean(other draws)|.
+    """
+    pool = np.column_stack([L, R1])
+    valid = ~np.isnan(pool)
+    n = valid.sum(axis=1, keepdims=True)
+    total = np.nansum(pool, axis=1, keepdims=True)
+    stat = np.abs(pool - (total - pool) / (n - 1))
+    observed = stat[:, -1:]
+    extreme = valid & (stat >= observed * (1 - _TIE_TOL))
+    return extreme.sum(axis=1) / n[:, 0]
+
+
+def _sign_flip_patterns(n_cols: int, rng, n_perm: int):
+    """(+/-1 pattern matrix, exact?) — all 2^n patterns when small enough, else random ones."""
+    if n_cols <= EXACT_SIGN_FLIP_LIMIT:
+        return np.array(list(itertools.product([1.0, -1.0], repeat=n_cols))), True
+    return rng.choice([1.0, -1.0], size=(n_perm, n_cols)), False
+
+
+def _sign_flip_p(diffs: np.ndarray, signs: np.ndarray, exact: bool) -> np.ndarray:
+    """
+    Paired sign-flip test per analyte on an analytes x astronauts matrix of
+    differences (NaN where an astronaut has no valid pair). Missing astronauts
+    contribute 0 under every pattern, so the enumeration stays exact.
+    """
+    d = np.nan_to_num(diffs)
+    observed = np.abs(d.sum(axis=1, keepdims=True))
+    flipped = np.abs(d @ signs.T)  # analytes x patterns; row sums stand in for means
+    count = (flipped >= observed * (1 - _TIE_TOL)).sum(axis=1)
+    return count / len(signs) if exact else (count + 1) / (len(signs) + 1)
+
+
+## Bootstrap
+def _row_percentiles(x: np.ndarray, weights: np.ndarray, quantiles) -> np.ndarray:
+    """
+    Per-row percentiles of x (rows x U), where column u stands for weights[u]
+    identical draws. Same result as numpy's linear percentile of the expanded
+    draws with NaNs dropped, from one argsort instead of one sort per row.
+    Returns rows x len(quantiles) (NaN for rows without valid values).
+    """
+    order = np.argsort(x, axis=1)                     # NaNs sort to the end
+    xs = np.take_along_axis(x, order, axis=1)
+    cum = np.cumsum(np.where(np.isnan(xs), 0, weights[order]), axis=1)
+    n = cum[:, -1]
+    rows = np.arange(len(x))
+    out = np.full((len(x), len(quantiles)), np.nan)
+    has = n > 0
+    for j, q in enumerate(quantiles):
+        pos = (n[has] - 1) * (q / 100)
+        lo = np.floor(pos)
+        hi = np.minimum(lo + 1, n[has] - 1)
+        # slot holding expanded draw k = number of cumulative counts <= k
+        low = xs[rows[has], (cum[has] <= lo[:, None]).sum(axis=1)]
+        high = xs[rows[has], (cum[has] <= hi[:, None]).sum(axis=1)]
+        out[has, j] = low + (high - low) * (pos - lo)
+    return out
+
+
+def _bootstrap_chunk(task):
+    """
+    Percentile CIs for one batch of rows sharing a sample size n.
+    values: rows x n; idx: distinct resample index rows (U x n) drawn
+    weights[u] times each. The resampled difference is offset + sign * mean
+    (within: R1 - mean(L*); group: mean(d*)), and Cohen's d divides it by the
+    resampled SD. Returns rows x 4: diff low/high, d low/high.
+    """
+    values, idx, weights, offset, sign, quantiles = task
+    samples = values[:, idx]                          # rows x U x n
+    mean = samples.mean(axis=2)
+    std = samples.std(axis=2, ddof=1)
+    diff = offset[:, None] + sign * mean
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d = np.where(std > 0, diff / std, np.nan)      # constant resamples have no d
+    return np.column_stack([_row_percentiles(diff, weights, quantiles),
+                            _row_percentiles(d, weights, quantiles)])
+
+
+def _bootstrap(values, counts, offset, sign, idx_by_n, quantiles, workers):
+    """
+    Bootstrap every row of a left-aligned, NaN-padded `values` matrix.
+    Rows are grouped by their number of valid values n. Each distinct
+    resample of the n_boot drawn for that n is evaluated once (for n=3 there
+    are at most 27), and rows are split into chunks of at most
+    MAX_BATCH_CELLS resampled cells.
+    """
+    out = np.full((len(values), 4), np.nan)
+    tasks, rows = [], []
+    for n, idx in idx_by_n.items():
+        idx, weights = np.unique(idx, axis=0, return_counts=True)
+        members = np.flatnonzero(counts == n)
+        step = max(1, MAX_BATCH_CELLS // (len(idx) * n))
+        for start in range(0, len(members), step):
+            chunk = members[start:start + step]
+            tasks.append((values[chunk, :n], idx, weights, offset[chunk], sign, quantiles))
+            rows.append(chunk)
+
+    if len(tasks) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_bootstrap_chunk, tasks))
+    else:
+        results = [_bootstrap_chunk(t) for t in tasks]
+
+    for chunk, result in zip(rows, results):
+        out[chunk] = result
+    return out
+
+
+def _left_align(matrix: np.ndarray) -> np.ndarray:
+    """Move each row's NaNs to the end, keeping the order of the valid values."""
+    order = np.argsort(np.isnan(matrix), axis=1, kind="stable")
+    return np.take_along_axis(matrix, order, axis=1)
+
+
+def _L_matrix(tidy: pd.DataFrame, within: pd.DataFrame) -> np.ndarray:
+    """pairs x max(n_L) matrix of the L-series values behind each row of `within`."""
+    values = tidy["value"].astype(float)
+    L_mask = _label_mask(tidy["timepoint"], lambda tps: tps.str.startswith("L")) & values.notna().to_numpy()
+
+    pairs = pd.MultiIndex.from_frame(within[["analyte", "astronautID"]])
+    keys = pd.MultiIndex.from_arrays([np.asarray(tidy["analyte"][L_mask], dtype=object),
+                                      np.asarray(tidy["astronautID"][L_mask], dtype=object)])
+    pair_idx = pairs.get_indexer(keys)
+    keep = pair_idx >= 0
+    pair_idx = pair_idx[keep]
+    slot = pd.Series(pair_idx).groupby(pair_idx).cumcount().to_numpy()
+
+    L = np.full((len(within), int(within["n_L"].max())), np.nan)
+    L[pair_idx, slot] = values[L_mask].to_numpy()[keep]
+    return L
+
+
+def resample_r1_vs_L(tidy: pd.DataFrame, within: pd.DataFrame,
+                     n_boot: int = DEFAULT_N_BOOT, n_perm: int = DEFAULT_N_PERM,
+                     ci: float = DEFAULT_CI, seed: int = DEFAULT_SEED,
+                     workers: int = 1) -> pd.DataFrame:
+    """
+    Permutation p-values and bootstrap CIs for the pairs in `within`
+    (stats._r1_vs_L_summary output) and for every analyte with at least two
+    such pairs. Returns analyte, astronautID, test_type + RESAMPLE_COLUMNS,
+    with astronautID 'ALL' on group rows. `n_perm` = 0 leaves perm_p NaN and
+    `n_boot` = 0 leaves the CIs NaN.
+    `workers` > 1 (or None: one per CPU) spreads bootstrap chunks over processes.
+    """
+    for name, value in [("n_boot", n_boot), ("n_perm", n_perm)]:
+        if value < 0:
+            raise ValueError(f"{name} must be >= 1, or 0 to skip it; got {value!r}")
+    rng = np.random.default_rng(seed)
+    quantiles = [100 * (1 - ci) / 2, 100 * (1 + ci) / 2]
+
+    ## Within-astronaut: relabeling test + bootstrap of the L-series draws
+    L = _L_matrix(tidy, within)
+    R1 = within["R1"].to_numpy(dtype=float)
+    n_L = within["n_L"].to_numpy()
+    within_p = _within_perm_p(L, R1) if n_perm else np.full(len(within), np.nan)
+
+    ## Group: per-astronaut differences as an analytes x astronauts matrix
+    diff_mat = within.assign(diff=R1 - within["mean_L"].to_numpy()) \
+        .pivot(index="analyte", columns="astronautID", values="diff")
+    n_group = diff_mat.notna().sum(axis=1).to_numpy()
+    paired = n_group >= 2
+    group_analytes = diff_mat.index.to_numpy()[paired]
+    diffs = _left_align(diff_mat.to_numpy()[paired])
+    n_group = n_group[paired]
+
+    # All random draws come from `rng` in a fixed order, before any batching
+    group_p = np.full(len(diffs), np.nan)
+    if n_perm:
+        signs, exact = _sign_flip_patterns(diffs.shape[1], rng, n_perm)
+        group_p = _sign_flip_p(diffs, signs, exact)
+    within_ci = np.full((len(within), 4), np.nan)
+    group_ci = np.full((len(diffs), 4), np.nan)
+    if n_boot:
+        group_idx = {n: rng.integers(0, n, size=(n_boot, n)) for n in np.unique(n_group)}
+        within_idx = {n: rng.integers(0, n, size=(n_boot, n)) for n in np.unique(n_L)}
+        within_ci = _bootstrap(L, n_L, R1, -1.0, within_idx, quantiles, workers)
+        group_ci = _bootstrap(diffs, n_group, np.zeros(len(diffs)), 1.0, group_idx, quantiles, workers)
+
+    within_df = pd.DataFrame({
+        "analyte": within["analyte"].to_numpy(),
+        "astronautID": within["astronautID"].to_numpy(),
+        "test_type": "within",
+        "perm_p": within_p,
+    })
+    group_df = pd.DataFrame({
+        "analyte": group_analytes,
+        "astronautID": "ALL",
+        "test_type": "group",
+        "perm_p": group_p,
+    })
+    within_df[RESAMPLE_COLUMNS[1:]] = within_ci
+    group_df[RESAMPLE_COLUMNS[1:]] = group_ci
+    return pd.concat([within_df, group_df], ignore_index=True)
@@ -1,7 +1,12 @@
+from bisect import bisect_left
+from functools import lru_cache
+from typing import NamedTuple
+
 import pandas as pd
 import numpy as np
-from scipy import stats
-from .featureEngineering import parse_timepoint
+from pandas.api.types import union_categoricals
+from .featureEngineering import parse_timepoints
+from .subjectIndex import load_subject_index
 
 # Map analyte base names to human labels + units + reference ranges
 ## To get sub and superscripts in Markdown I used ChatGPT: https://chatgpt.com/share/68d9c8f6-2674-8008-8ff7-0731bec9ad49
@@ -47,6 +52,72 @@ ANALYTE_INFO = {
     "sap": {"label": "SAP (Serum Amyloid P)", "unit": "pg/mL"},
 }
 
+TIDY_COLUMNS = ["astronautID", "timepoint", "flight_day", "analyte", "value",
+                "min", "max", "label", "unit", "sex"]
+
+# String columns of the tidy frame, stored as categoricals: each row holds a
+# small integer code and the distinct strings are kept once in the dtype's
+# categories. label/unit are per-analyte and sex is per-astronaut, so their
+# categories act as side tables joined through the codes.
+TIDY_CATEGORICAL_COLUMNS = ["astronautID", "timepoint", "analyte", "label", "unit", "sex"]
+TIDY_FLOAT_COLUMNS = ["value", "min", "max"]
+
+
+def compact_tidy(tidy: pd.DataFrame, value_dtype="float64") -> pd.DataFrame:
+    """
+    Return `tidy` with categorical string columns and float arrays.
+    `value_dtype="float32"` halves the value/min/max arrays further; the default
+    keeps float64 so stats are unchanged. Categories are sorted, so groupbys and
+    sorts on the keys give the same order as on plain strings.
+    """
+    out = {}
+    for col in tidy.columns:
+        values = tidy[col]
+        if col in TIDY_CATEGORICAL_COLUMNS:
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype("category")
+            elif not values.cat.categories.is_monotonic_increasing:
+                values = values.cat.reorder_categories(values.cat.categories.sort_values())
+        elif col in TIDY_FLOAT_COLUMNS:
+            values = values.astype(value_dtype)
+        out[col] = values
+    return pd.DataFrame(out, index=tidy.index)
+
+
+def concat_tidy(frames) -> pd.DataFrame:
+    """
+    Concatenate compact tidy frames, unioning the categories of each string
+    column so the result stays categorical (plain pd.concat falls back to
+    object columns when the categories differ).
+    """
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=TIDY_COLUMNS)
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    out = {}
+    for col in frames[0].columns:
+        parts = [f[col] for f in frames]
+        if col in TIDY_CATEGORICAL_COLUMNS:
+            out[col] = union_categoricals(parts, sort_categories=True)
+        else:
+            out[col] = np.concatenate([p.to_numpy() for p in parts])
+    return pd.DataFrame(out)
+
+
+def _expand(lookup, codes) -> pd.Categorical:
+    """Categorical with lookup[codes[i]] per row; `lookup` may repeat values (e.g. units)."""
+    categories, inverse = np.unique(np.asarray(lookup, dtype=object).astype(str), return_inverse=True)
+    return pd.Categorical.from_codes(inverse[codes], categories)
+
+
+def _label_mask(labels: pd.Series, test) -> np.ndarray:
+    """Boolean row mask with `test` evaluated once per distinct label, not per row."""
+    if not isinstance(labels.dtype, pd.CategoricalDtype):
+        labels = labels.astype("category")
+    hits = np.append(np.asarray(test(labels.cat.categories.astype(str)), dtype=bool), False)
+    return hits[labels.cat.codes.to_numpy()]  # code -1 (missing) -> False
+
 # Helpers to find columns by prefix (robust to unit suffixes)
 def _first_col_startswith(df: pd.DataFrame, prefixes) -> str | None:
     """
@@ -63,11 +134,73 @@ def _first_col_startswith(df: pd.DataFrame, prefixes) -> str | None:
     return None
 
 
+class ColumnPlan(NamedTuple):
+    """
+    Resolved wide-format columns for every ANALYTE_INFO entry.
+    columns: analyte -> (value_col, min_col, max_col, percent_col); any may be None
+    unmatched: ANALYTE_INFO entries with no value column in the header
+    """
+    columns: dict
+    unmatched: list
+
+
+def _prefix_match(sorted_names, positions, prefixes):
+    """
+    Position (in header order) of the first column starting with any prefix,
+    using binary search over the sorted lowercase header.
+    """
+    best = None
+    for p in prefixes:
+        i = bisect_left(sorted_names, p)
+        while i < len(sorted_names) and sorted_names[i].startswith(p):
+            if best is None or positions[i] < best:
+                best = positions[i]
+            i += 1
+    return best
+
+
+@lru_cache(maxsize=32)
+def _compile_column_plan(header: tuple, analytes: tuple) -> ColumnPlan:
+    """Build the ColumnPlan for one header signature (cached)."""
+    order = sorted(range(len(header)), key=lambda i: header[i].lower())
+    sorted_names = [header[i].lower() for i in order]
+
+    def lookup(*prefixes):
+        pos = _prefix_match(sorted_names, order, [p.lower() for p in prefixes])
+        return None if pos is None else header[pos]
+
+    columns, unmatched = {}, []
+    for analyte in analytes:
+        value = lookup(f"{analyte}_value") or lookup(f"{analyte}_concentration")
+        if value is None:
+            unmatched.append(analyte)
+        columns[analyte] = (
+            value,
+            lookup(f"{analyte}_range_min", f"{analyte}_min"),
+            lookup(f"{analyte}_range_max", f"{analyte}_max"),
+            lookup(f"{analyte}_percent"),
+        )
+    return ColumnPlan(columns, unmatched)
+
+
+def column_plan(df: pd.DataFrame) -> ColumnPlan:
+    """
+    Map each ANALYTE_INFO entry to its value/min/max/percent columns in `df`.
+    The header is indexed once and plans are cached by header signature, so
+    repeated loads of same-schema files skip resolution entirely.
+    """
+    header = tuple(str(c) for c in df.columns)
+    return _compile_column_plan(header, tuple(ANALYTE_INFO))
+
+
 def _value_min_max_cols(df: pd.DataFrame, analyte: str):
     """
     For a given base analyte name, return (value_col, min_col, max_col).
     Works with clinical chemistry (…_value) and cardiovascular (…_concentration / …_percent).
     """
+    if analyte in ANALYTE_INFO:
+        return column_plan(df).columns[analyte][:3]
+
     v = _first_col_startswith(df, f"{analyte}_value")
     if v is None:
         v = _first_col_startswith(df, f"{analyte}_concentration")
@@ -78,14 +211,15 @@ def _value_min_max_cols(df: pd.DataFrame, analyte: str):
     return v, mn, mx
 
 # Tidy Transformation
-def tidy_from_wide(df: pd.DataFrame) -> pd.DataFrame:
+def tidy_from_wide(df: pd.DataFrame, subjects=None) -> pd.DataFrame:
     """
     Transform astronaut CSV with value/min/max triplets into tidy format.
     Adds derived analytes (like Anion Gap) using flexible column matching.
+    Columns are resolved once per analyte and stacked as whole blocks, so the
+    cost grows with the number of columns rather than rows x analytes.
+    Sex comes from `subjects` (default: subjectIndex.load_subject_index()).
     Returns: columns [astronautID, timepoint, flight_day, analyte, value, min, max, unit, label, sex]
     """
-    tidy_records = []
-
     # normalize lookup for id/timepoint columns
     colmap = {c.lower(): c for c in df.columns}
     astronaut_col = colmap.get("astronautid")
@@ -94,112 +228,210 @@ def tidy_from_wide(df: pd.DataFrame) -> pd.DataFrame:
     if astronaut_col is None or timepoint_col is None:
         raise KeyError("Expected astronautID and timepoint columns in input CSV")
 
-    for analyte, meta in ANALYTE_INFO.items():
+    # Resolve value/min/max columns once per header (cached column plan)
+    plan = column_plan(df)
+    analytes, value_cols, min_block, max_block = [], [], {}, {}
+    for analyte, (value_col, min_col, max_col, _) in plan.columns.items():
         if analyte == "anion_gap":
             continue
 
-        value_col, min_col, max_col = _value_min_max_cols(df, analyte)
         if value_col is None:
             continue
 
-        for _, row in df.iterrows():
-            rec = {
-                "astronautID": row[astronaut_col],
-                "timepoint": row[timepoint_col],
-                "flight_day": parse_timepoint(row[timepoint_col]),
-                "analyte": analyte,
-                "value": row[value_col],
-                "min": (row[min_col] if (min_col and pd.notna(row[min_col])) else meta.get("min")),
-                "max": (row[max_col] if (max_col and pd.notna(row[max_col])) else meta.get("max")),
-                "label": meta["label"],
-                "unit": meta["unit"],
-                "sex": "Male" if str(row[astronaut_col]) in ["C001", "C004"] else "Female",
-            }
-            tidy_records.append(rec)
-
-    return pd.DataFrame(tidy_records)
+        analytes.append(analyte)
+        value_cols.append(value_col)
+        min_block[analyte] = df[min_col] if min_col else np.nan
+        max_block[analyte] = df[max_col] if max_col else np.nan
+
+    if not analytes:
+        return pd.DataFrame(columns=TIDY_COLUMNS)
+
+    n_rows, n_analytes = len(df), len(analytes)
+
+    ## Reference ranges: fall back to manual ANALYTE_INFO bounds where missing
+    mins = pd.DataFrame(min_block, index=df.index, columns=analytes, dtype=float)
+    maxs = pd.DataFrame(max_block, index=df.index, columns=analytes, dtype=float)
+    mins = mins.fillna({a: ANALYTE_INFO[a]["min"] for a in analytes if "min" in ANALYTE_INFO[a]})
+    maxs = maxs.fillna({a: ANALYTE_INFO[a]["max"] for a in analytes if "max" in ANALYTE_INFO[a]})
+
+    ## Per-row keys are computed once and tiled across analytes
+    astronauts = df[astronaut_col]
+    timepoints = df[timepoint_col]
+    # add_flight_day has already placed each label on the flight-day axis
+    flight_days = df["flight_day"].to_numpy() if "flight_day" in df.columns \
+        else parse_timepoints(timepoints)
+
+    ## Stack analyte blocks column-major: all rows of analyte 1, then analyte 2, ...
+    # Per-analyte label/unit and per-astronaut sex are looked up once and
+    # expanded through the integer codes, never as per-row strings
+    analyte_codes = np.repeat(np.arange(n_analytes), n_rows)
+    astronaut_cat = pd.Categorical(astronauts)
+    astronaut = pd.Categorical.from_codes(np.tile(astronaut_cat.codes, n_analytes), astronaut_cat.categories)
+    subjects = load_subject_index() if subjects is None else subjects
+    return compact_tidy(pd.DataFrame({
+        "astronautID": astronaut,
+        "timepoint": pd.Categorical(np.tile(timepoints.to_numpy(), n_analytes)),
+        "flight_day": np.tile(flight_days, n_analytes),
+        "analyte": _expand(analytes, analyte_codes),
+        "value": df[value_cols].to_numpy(dtype=float).ravel(order="F"),
+        "min": mins.to_numpy().ravel(order="F"),
+        "max": maxs.to_numpy().ravel(order="F"),
+        "label": _expand([ANALYTE_INFO[a]["label"] for a in analytes], analyte_codes),
+        "unit": _expand([ANALYTE_INFO[a]["unit"] for a in analytes], analyte_codes),
+        "sex": subjects.sex_for(astronaut),
+    }))
+
 
 # Statistical Comparison: R+1 vs L-series
-def analyze_r1_vs_L(tidy: pd.DataFrame) -> pd.DataFrame:
+R1_LABELS = ["R+1", "R1", "R+01"]
+
+# Parametric columns, then the permutation/bootstrap ones (see resampling.py)
+STATS_COLUMNS = ["analyte", "astronautID", "test_type", "n_L", "mean_L", "R1",
+                 "std_L", "se_L", "t_stat", "p_value", "effect_size",
+                 "perm_p", "diff_ci_low", "diff_ci_high", "d_ci_low", "d_ci_high"]
+
+# Resampling defaults: bootstrap draws, Monte Carlo sign flips (large cohorts
+# only), confidence level and generator seed
+DEFAULT_N_BOOT = 2000
+DEFAULT_N_PERM = 10000
+DEFAULT_CI = 0.95
+DEFAULT_SEED = 0
+
+# Decimals of the resampling columns in the stats table
+RESAMPLE_ROUNDING = {"perm_p": 4, "diff_ci_low": 2, "diff_ci_high": 2, "d_ci_low": 3, "d_ci_high": 3}
+
+
+def _round(values, decimals: int) -> np.ndarray:
+    """
+    Python's round() per value: rounds the exact binary value, so a mean of
+    3.725 stays 3.73 where np.round (scale, round, unscale) can give 3.72.
+    """
+    return np.array([round(float(v), decimals) for v in np.asarray(values, dtype=float)])
+
+
+def _r1_vs_L_summary(tidy: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate every (analyte, astronautID) pair in one pass.
+    Returns n_L, mean_L, std_L (ddof=1) and the R+1 value for pairs with at
+    least two L-series values and exactly one R+1 value.
+    """
+    values = tidy["value"].astype(float)
+    has_value = values.notna().to_numpy()
+    keys = [tidy["analyte"], tidy["astronautID"]]
+
+    L_mask = _label_mask(tidy["timepoint"], lambda tps: tps.str.startswith("L")) & has_value
+    R1_mask = _label_mask(tidy["timepoint"], lambda tps: tps.isin(R1_LABELS)) & has_value
+
+    L_grp = values[L_mask].groupby([k[L_mask] for k in keys], sort=True, observed=True)
+    L_stats = pd.DataFrame({
+        "n_L": L_grp.count(),
+        "mean_L": L_grp.mean(),
+        "std_L": L_grp.std(ddof=1),
+    })
+    R1_grp = values[R1_mask].groupby([k[R1_mask] for k in keys], sort=True, observed=True)
+    R1_stats = pd.DataFrame({"n_R1": R1_grp.count(), "R1": R1_grp.first()})
+
+    summary = L_stats.join(R1_stats, how="inner")
+    summary = summary[(summary["n_L"] >= 2) & (summary["n_R1"] == 1)]
+    summary.index.names = ["analyte", "astronautID"]
+    summary = summary.drop(columns="n_R1").reset_index()
+    # The stats table is small; keep its keys as plain strings
+    return summary.astype({"analyte": object, "astronautID": object})
+
+
+def analyze_r1_vs_L(tidy: pd.DataFrame, n_boot: int = DEFAULT_N_BOOT,
+                    n_perm: int = DEFAULT_N_PERM, ci: float = DEFAULT_CI,
+                    seed: int = DEFAULT_SEED, workers: int = 1) -> pd.DataFrame:
     """
     Compare R+1 vs L-series for each analyte.
     - Within-astronaut: one-sample t-test (H0: mean(L) == R+1)
       Returns per-astronaut mean, std, SE, t-stat, p-value, and Cohen's d.
     - Across-astronauts (group-level): paired t-test on per-astronaut mean(L) vs R+1
       Returns group mean, std across astronauts, SEM, t-stat, p-value, and Cohen's d.
+    Per-astronaut aggregates are computed once and every p-value is evaluated
+    in a single vectorized call to the t distribution.
+    Each row also gets an exact permutation p-value and bootstrap CIs of
+    R+1 - mean(L) and Cohen's d (resampling.resample_r1_vs_L; `n_boot`
+    draws, reproducible for a given `seed`). `n_perm=0` / `n_boot=0` skip
+    the permutation tests / bootstrap and leave those columns NaN.
     """
-    results = []
-    for analyte, subdf in tidy.groupby("analyte"):
-
-        ## Within-astronaut tests
-        for astronaut, adf in subdf.groupby("astronautID"):
-            L_mask = adf["timepoint"].astype(str).str.startswith("L")
-            R1_mask = adf["timepoint"].astype(str).isin(["R+1", "R1", "R+01"])
-
-            L_vals = adf.loc[L_mask, "value"].dropna().astype(float)
-            R1_vals = adf.loc[R1_mask, "value"].dropna().astype(float)
-
-            if len(L_vals) >= 2 and len(R1_vals) == 1:
-                R1 = float(R1_vals.iloc[0])
-                mean_L = float(L_vals.mean())
-                std_L = float(L_vals.std(ddof=1))
-                n_L = int(L_vals.shape[0])
-
-                if std_L > 0:
-                    se = std_L / np.sqrt(n_L)
-                    t_stat = (mean_L - R1) / se
-                    p_val = 2 * (1 - stats.t.cdf(abs(t_stat), df=n_L - 1))
-                    cohen_d = (R1 - mean_L) / std_L
-                else:
-                    se = t_stat = p_val = cohen_d = np.nan
-
-                results.append({
-                    "analyte": analyte,
-                    "astronautID": astronaut,
-                    "test_type": "within",
-                    "n_L": n_L,
-                    "mean_L": round(mean_L, 2),
-                    "R1": round(R1, 2),
-                    "std_L": round(std_L, 2),
-                    "se_L": round(se, 2) if pd.notna(se) else np.nan,
-                    "t_stat": round(t_stat, 3) if pd.notna(t_stat) else np.nan,
-                    "p_value": round(p_val, 4) if pd.notna(p_val) else np.nan,
-                    "effect_size": round(cohen_d, 3) if pd.notna(cohen_d) else np.nan,
-                })
-
-        ## Across-astronauts (paired test)
-        astronaut_means, astronaut_R1 = [], []
-        for astronaut, adf in subdf.groupby("astronautID"):
-            L_mask = adf["timepoint"].astype(str).str.startswith("L")
-            R1_mask = adf["timepoint"].astype(str).isin(["R+1", "R1", "R+01"])
-
-            L_vals = adf.loc[L_mask, "value"].dropna().astype(float)
-            R1_vals = adf.loc[R1_mask, "value"].dropna().astype(float)
-
-            if len(L_vals) >= 2 and len(R1_vals) == 1:
-                astronaut_means.append(float(L_vals.mean()))
-                astronaut_R1.append(float(R1_vals.iloc[0]))
-
-        if len(astronaut_means) >= 2:
-            diffs = np.array(astronaut_R1) - np.array(astronaut_means)
-            t_stat, p_val = stats.ttest_rel(astronaut_R1, astronaut_means)
-
-            # Group-level variability
-            std_L = np.std(astronaut_means, ddof=1)
-            se_L = std_L / np.sqrt(len(astronaut_means))
-
-            cohen_d = diffs.mean() / diffs.std(ddof=1) if diffs.std(ddof=1) > 0 else np.nan
-
-            results.append({
-                "analyte": analyte,
-                "astronautID": "ALL",
-                "test_type": "group",
-                "n_L": len(astronaut_means),
-                "mean_L": round(float(np.mean(astronaut_means)), 2),
-                "R1": round(float(np.mean(astronaut_R1)), 2),
-                "t_stat": round(float(t_stat), 3),
-                "p_value": round(float(p_val), 4),
-                "effect_size": round(float(cohen_d), 3) if pd.notna(cohen_d) else np.nan,
-            })
-
-    return pd.DataFrame(results)
+    from scipy import stats  # imported lazily: only needed when stats are recomputed
+    from .resampling import resample_r1_vs_L
+
+    within = _r1_vs_L_summary(tidy)
+    if within.empty:
+        return pd.DataFrame(columns=STATS_COLUMNS)
+
+    ## Within-astronaut tests
+    std_L = within["std_L"].to_numpy()
+    n_L = within["n_L"].to_numpy()
+    varying = std_L > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        se_within = np.where(varying, std_L / np.sqrt(n_L), np.nan)
+        t_within = (within["mean_L"].to_numpy() - within["R1"].to_numpy()) / se_within
+        d_within = np.where(varying, (within["R1"] - within["mean_L"]).to_numpy() / std_L, np.nan)
+
+    ## Across-astronauts (paired test on per-astronaut means)
+    # analyte x astronaut matrices; astronauts without a valid test are NaN
+    mean_mat = within.pivot(index="analyte", columns="astronautID", values="mean_L")
+    R1_mat = within.pivot(index="analyte", columns="astronautID", values="R1")
+    diff_mat = (R1_mat - mean_mat).to_numpy()
+
+    n_group = mean_mat.notna().sum(axis=1).to_numpy()
+    paired = n_group >= 2
+    group_analytes = mean_mat.index.to_numpy()[paired]
+    n_group = n_group[paired]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        group_mean_L = np.nanmean(mean_mat.to_numpy()[paired], axis=1)
+        group_R1 = np.nanmean(R1_mat.to_numpy()[paired], axis=1)
+        diff_mean = np.nanmean(diff_mat[paired], axis=1)
+        diff_std = np.nanstd(diff_mat[paired], axis=1, ddof=1)
+        t_group = diff_mean / (diff_std / np.sqrt(n_group))
+        d_group = np.where(diff_std > 0, diff_mean / diff_std, np.nan)
+
+    ## One vectorized evaluation of the two-sided p-values
+    t_all = np.concatenate([t_within, t_group])
+    dof_all = np.concatenate([n_L - 1, n_group - 1])
+    p_all = 2 * stats.t.sf(np.abs(t_all), df=dof_all)
+    p_within, p_group = p_all[:len(within)], p_all[len(within):]
+
+    within_df = pd.DataFrame({
+        "analyte": within["analyte"].to_numpy(),
+        "astronautID": within["astronautID"].to_numpy(),
+        "test_type": "within",
+        "n_L": n_L.astype(int),
+        "mean_L": _round(within["mean_L"].to_numpy(), 2),
+        "R1": _round(within["R1"].to_numpy(), 2),
+        "std_L": _round(std_L, 2),
+        "se_L": _round(se_within, 2),
+        "t_stat": _round(t_within, 3),
+        "p_value": _round(p_within, 4),
+        "effect_size": _round(d_within, 3),
+    })
+    group_df = pd.DataFrame({
+        "analyte": group_analytes,
+        "astronautID": "ALL",
+        "test_type": "group",
+        "n_L": n_group.astype(int),
+        "mean_L": _round(group_mean_L, 2),
+        "R1": _round(group_R1, 2),
+        "t_stat": _round(t_group, 3),
+        "p_value": _round(p_group, 4),
+        "effect_size": _round(d_group, 3),
+    }, columns=STATS_COLUMNS)
+
+    # Keep the per-analyte layout: within rows followed by the group row
+    results = pd.concat([within_df, group_df.astype(within_df.dtypes.to_dict())],
+                        ignore_index=True)
+    results = results.sort_values("analyte", kind="stable", ignore_index=True)
+
+    ## Permutation p-values and bootstrap CIs for the same rows
+    if not (n_boot or n_perm):
+        return results.assign(**{col: np.nan for col in RESAMPLE_ROUNDING})[STATS_COLUMNS]
+    resampled = resample_r1_vs_L(tidy, within, n_boot=n_boot, n_perm=n_perm,
+                                 ci=ci, seed=seed, workers=workers)
+    for col, decimals in RESAMPLE_ROUNDING.items():
+        resampled[col] = _round(resampled[col], decimals)
+    results = results.drop(columns=resampled.columns[3:]) \
+        .merge(resampled, on=["analyte", "astronautID", "test_type"], how="left")
+    return results[STATS_COLUMNS]
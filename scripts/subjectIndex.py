@@ -0,0 +1,114 @@
+"""
+Subject and sample metadata from the OSD-575 ISA study table.
+
+`s_OSD-575.txt` lists one sample per row:
+    Source Name   Sample Name       Characteristics[Sex]   Factor Value[Time]   Factor Value[Spaceflight]
+    C001          C001_serum_L-3    Male                   Launch minus 3       Pre-flight
+It is parsed once per file version into a SubjectIndex: one row per subject
+(astronautID -> sex) and one per sample (astronautID, timepoint). Tidy frames
+get their `sex` column through a categorical join: the index is looked up
+once per distinct astronautID and the result is expanded through the codes,
+so the lookup cost depends on the crew size, not on the number of rows.
+Subjects missing from the study table get no sex (NaN).
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .dataCache import file_signature
+
+# Resolved against the repo root, so callers outside it (notebooks, /tmp) find the table
+ISA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "data", "OSD-575_metadata_OSD-575-ISA")
+STUDY_FILE = os.path.join(ISA_FOLDER, "s_OSD-575.txt")
+
+# ISA study column -> index column
+STUDY_COLUMNS = {
+    "Source Name": "astronautID",
+    "Sample Name": "sample_name",
+    "Characteristics[Sex]": "sex",
+    "Factor Value[Time]": "time",
+    "Factor Value[Spaceflight]": "spaceflight",
+}
+
+
+class SubjectIndex:
+    """
+    `subjects`: astronautID-indexed frame with a categorical `sex` column.
+    `samples`: astronautID, timepoint, sample_name, time, spaceflight per sample.
+    `digest` is the study file hash (None without one), for artifact freshness.
+    """
+
+    def __init__(self, subjects: pd.DataFrame, samples: pd.DataFrame, digest: str = None):
+        self.subjects = subjects
+        self.samples = samples
+        self.digest = digest
+
+    @classmethod
+    def empty(cls) -> "SubjectIndex":
+        subjects = pd.DataFrame({"sex": pd.Categorical([])}, index=pd.Index([], name="astronautID"))
+        return cls(subjects, pd.DataFrame(columns=["astronautID", "timepoint"] + list(STUDY_COLUMNS.values())[1:]))
+
+    @property
+    def astronauts(self) -> list:
+        return self.subjects.index.tolist()
+
+    @property
+    def sexes(self) -> list:
+        """Distinct sexes recorded for the crew, sorted."""
+        return self.subjects["sex"].cat.categories.tolist()
+
+    def astronauts_with(self, sex: str) -> list:
+        return self.subjects.index[(self.subjects["sex"] == sex).to_numpy()].tolist()
+
+    def sex_for(self, astronauts) -> pd.Categorical:
+        """
+        Sex of each entry of `astronauts` (IDs, as a Series, array or
+        Categorical), joined once per distinct ID and expanded through the codes.
+        """
+        astronauts = astronauts if isinstance(astronauts, pd.Categorical) \
+            else pd.Categorical(np.asarray(astronauts, dtype=object))
+        sex = self.subjects["sex"]
+        # one lookup per distinct ID; -1 = not in the study table
+        positions = self.subjects.index.get_indexer(astronauts.categories.astype(str).str.strip().str.upper())
+        sex_codes = sex.cat.codes.to_numpy()
+        lookup = np.full(len(positions) + 1, -1, dtype=np.int64)
+        found = positions >= 0
+        lookup[:-1][found] = sex_codes[positions[found]]
+        codes = lookup[np.where(astronauts.codes >= 0, astronauts.codes, len(lookup) - 1)]
+        return pd.Categorical.from_codes(codes, dtype=sex.dtype)
+
+
+def read_subject_index(path: str = STUDY_FILE) -> SubjectIndex:
+    """Parse an ISA study table into a SubjectIndex (not cached, see load_subject_index)."""
+    study = pd.read_csv(path, sep="\t", usecols=lambda c: c in STUDY_COLUMNS, dtype=str, encoding="utf-8-sig")
+    missing = [c for c in ["Source Name", "Characteristics[Sex]"] if c not in study.columns]
+    if missing:
+        raise KeyError(f"ISA study table is missing columns: {', '.join(missing)}")
+    samples = study.rename(columns=STUDY_COLUMNS)
+    samples["astronautID"] = samples["astronautID"].str.strip().str.upper()
+    samples["sex"] = samples["sex"].str.strip().str.capitalize()
+    # Sample names end with the timepoint label: C001_serum_L-3 -> L-3
+    if "sample_name" in samples.columns:
+        samples.insert(1, "timepoint", samples["sample_name"].str.rsplit("_", n=1).str[-1])
+
+    subjects = samples.groupby("astronautID", sort=True)[["sex"]].first()
+    subjects["sex"] = subjects["sex"].astype("category")
+    return SubjectIndex(subjects, samples.reset_index(drop=True), file_signature(path)[2])
+
+
+@lru_cache(maxsize=8)
+def _cached_index(path: str, mtime_ns: int, digest: str) -> SubjectIndex:
+    return read_subject_index(path)
+
+
+def load_subject_index(path: str = STUDY_FILE) -> SubjectIndex:
+    """
+    SubjectIndex for the study table at `path`, parsed once per process and
+    file version. An empty index when the file doesn't exist.
+    """
+    if not os.path.exists(path):
+        return SubjectIndex.empty()
+    return _cached_index(*file_signature(path))
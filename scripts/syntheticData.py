@@ -0,0 +1,115 @@
+"""
+Synthetic astronaut cohorts in the same column conventions as the real data.
+
+Wide panels follow final_data/ (Sample Name, <analyte>_value_<unit> /
+_range_min_<unit> / _range_max_<unit> or <analyte>_concentration_<unit> /
+_percent, astronautID, timepoint). Long panels follow the Eve SUBMITTED
+uploads (Analyte, Concentration, Timepoint, ID, Unit, ...). Used by the
+benchmark suite to expose scaling problems the 4-astronaut dataset hides.
+"""
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from .stats import ANALYTE_INFO
+
+
+def synthetic_analytes(n_analytes: int) -> list:
+    """Analyte keys 'syn_0000', 'syn_0001', ..."""
+    return [f"syn_{i:04d}" for i in range(n_analytes)]
+
+
+def synthetic_subjects(n_subjects: int) -> list:
+    """Astronaut IDs 'C001', 'C002', ..."""
+    return [f"C{i + 1:03d}" for i in range(n_subjects)]
+
+
+def synthetic_timepoints(n_timepoints: int) -> list:
+    """
+    Timepoint labels with the real structure: an L-series before launch,
+    always R+1, then later recovery days. Needs at least 3 (two L + R+1).
+    """
+    if n_timepoints < 3:
+        raise ValueError("n_timepoints must be at least 3 (two L-series points and R+1)")
+    n_pre = (n_timepoints + 1) // 2
+    n_post = n_timepoints - n_pre
+    pre = [f"L-{d}" for d in np.linspace(92, 3, n_pre).round().astype(int)]
+    post = ["R+1"] + [f"R+{d}" for d in np.linspace(45, 194, n_post - 1).round().astype(int)] \
+        if n_post > 1 else ["R+1"]
+    return pre + post
+
+
+@contextmanager
+def registered_analytes(names, unit="mg/dL"):
+    """Temporarily add synthetic analytes to ANALYTE_INFO so tidy_from_wide picks them up."""
+    added = [n for n in names if n not in ANALYTE_INFO]
+    for n in added:
+        ANALYTE_INFO[n] = {"label": n.upper(), "unit": unit}
+    try:
+        yield
+    finally:
+        for n in added:
+            ANALYTE_INFO.pop(n, None)
+
+
+def _values(rng, n_rows, n_analytes):
+    """Per-analyte baselines with per-row noise, all positive."""
+    base = rng.uniform(1, 1000, size=n_analytes)
+    return base * rng.lognormal(0.0, 0.1, size=(n_rows, n_analytes))
+
+
+def make_wide_panel(n_subjects: int = 4, n_timepoints: int = 6, n_analytes: int = 20,
+                    kind: str = "value", seed: int = 0) -> pd.DataFrame:
+    """
+    Wide panel with one row per (astronaut, timepoint).
+    kind="value" -> CMP-style value/range_min/range_max triplets,
+    kind="concentration" -> Eve-style concentration/percent pairs.
+    """
+    rng = np.random.default_rng(seed)
+    subjects = synthetic_subjects(n_subjects)
+    timepoints = synthetic_timepoints(n_timepoints)
+    analytes = synthetic_analytes(n_analytes)
+
+    ids = np.repeat(subjects, len(timepoints))
+    tps = np.tile(timepoints, len(subjects))
+    values = _values(rng, len(ids), n_analytes)
+
+    columns = {"Sample Name": [f"{a}_serum_{t}" for a, t in zip(ids, tps)]}
+    for j, analyte in enumerate(analytes):
+        if kind == "value":
+            columns[f"{analyte}_value_milligram_per_deciliter"] = values[:, j].round(2)
+            columns[f"{analyte}_range_min_milligram_per_deciliter"] = np.round(values[:, j].mean() * 0.8, 2)
+            columns[f"{analyte}_range_max_milligram_per_deciliter"] = np.round(values[:, j].mean() * 1.2, 2)
+        elif kind == "concentration":
+            columns[f"{analyte}_concentration_picogram_per_milliliter"] = values[:, j].round(2)
+            columns[f"{analyte}_percent"] = (100 * values[:, j] / values[:, j].mean()).round(4)
+        else:
+            raise ValueError("kind must be 'value' or 'concentration'")
+    columns["astronautID"] = ids
+    columns["timepoint"] = tps
+    return pd.DataFrame(columns)
+
+
+def make_long_panel(n_subjects: int = 4, n_timepoints: int = 6, n_analytes: int = 20,
+                    seed: int = 0) -> pd.DataFrame:
+    """Long panel with one row per (analyte, timepoint, astronaut), Eve SUBMITTED layout."""
+    rng = np.random.default_rng(seed)
+    subjects = synthetic_subjects(n_subjects)
+    timepoints = synthetic_timepoints(n_timepoints)
+    analytes = synthetic_analytes(n_analytes)
+
+    n_samples = len(subjects) * len(timepoints)
+    values = _values(rng, n_samples, n_analytes)  # rows: samples, columns: analytes
+
+    return pd.DataFrame({
+        "Analyte": np.repeat(analytes, n_samples),
+        "Concentration": values.T.ravel().round(2),
+        "Timepoint": np.tile(np.repeat(timepoints, len(subjects)), n_analytes),
+        "ID": np.tile(subjects, len(timepoints) * n_analytes),
+        "Unit": "pg/ml",
+        "Timepoint2": np.tile(np.repeat(["Preflight" if t.startswith("L") else "Postflight"
+                                         for t in timepoints], len(subjects)), n_analytes),
+        "Type": "SYN",
+        "Percent": 100.0,
+    })
@@ -0,0 +1,165 @@
+"""
+Recovery-trajectory fits for every analyte.
+
+For the post-flight (R-series) points, the deviation from each astronaut's
+L-series baseline is modelled as a polynomial in days since return:
+
+    value - baseline = intercept + slope * t (+ curvature * t^2),   t = flight_day - stretch
+
+so `intercept` is the departure from baseline at R+0 and the fitted curve in
+value units is baseline + polynomial. Fits are per astronaut and pooled over
+astronauts (each against their own baseline), from the analyte x astronaut x
+timepoint values of a ValueCube. The design matrix is built once for the
+distinct post-flight days and every fit is solved at the same time from
+stacked normal equations; missing draws get zero weight.
+"""
+import numpy as np
+import pandas as pd
+
+from .featureEngineering import FLIGHT_STRETCH
+from .valueCube import ValueCube, as_cube
+
+DEGREES = [1, 2]
+DEFAULT_DEGREE = 1
+COEF_COLUMNS = ["intercept", "slope", "curvature"]
+
+TRAJECTORY_COLUMNS = ["analyte", "astronautID", "fit_type", "degree", "n_points",
+                      "first_day", "last_day", "baseline"] + COEF_COLUMNS + ["resid_se"]
+
+
+def _deviation_cube(cube: ValueCube, stretch: int = FLIGHT_STRETCH):
+    """
+    analyte x astronaut x post-flight-day array of value - L-baseline
+    (timepoints sharing a day averaged), plus the baselines, axis labels and
+    days since return.
+    """
+    values = cube.by_analyte()                                  # A x S x T
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.0)
+    labels = cube.timepoints.astype(str)
+    tp_days = cube.day_values
+
+    ## Per-astronaut baselines: mean of the L-series draws
+    L = np.asarray(labels.str.startswith("L"), dtype=bool)
+    with np.errstate(invalid="ignore"):
+        baseline = x[..., L].sum(axis=2) / valid[..., L].sum(axis=2)
+
+    ## Post-flight timepoints folded onto the distinct-day axis
+    R = np.asarray(labels.str.startswith("R"), dtype=bool) & ~np.isnan(tp_days)
+    days, d_codes = np.unique(tp_days[R] - stretch, return_inverse=True)
+    fold = np.zeros((R.sum(), len(days)))
+    fold[np.arange(len(d_codes)), d_codes] = 1.0
+    with np.errstate(invalid="ignore"):
+        dev = (x[..., R] @ fold) / (valid[..., R] @ fold)
+    return dev - baseline[..., None], baseline, cube.analytes, cube.astronauts, days
+
+
+def _solve(XtX, Xty, fit):
+    """Batched solve of the normal equations for the fits flagged in `fit`."""
+    beta = np.full(Xty.shape, np.nan)
+    if fit.any():
+        beta[fit] = np.linalg.solve(XtX[fit], Xty[fit][..., None])[..., 0]
+    return beta
+
+
+def fit_trajectories(tidy, degree: int = DEFAULT_DEGREE,
+                     stretch: int = FLIGHT_STRETCH) -> pd.DataFrame:
+    """
+    Per-astronaut and pooled polynomial recovery fits for every analyte.
+    Returns TRAJECTORY_COLUMNS: fit_type 'astronaut' or 'pooled' (astronautID
+    'ALL'; baseline is the mean of the astronaut baselines), first/last_day
+    (days since return covered by the data), coefficients in value units per
+    day (curvature NaN for degree 1) and the residual SE (NaN without spare
+    degrees of freedom). Fits need post-flight draws on at least degree + 1
+    distinct days; pooled fits also need two astronauts. `stretch` is the
+    flight day R+0 sits at in tidy (see featureEngineering.parse_timepoint).
+    `tidy` is a tidy frame or a ValueCube, which is used as is.
+    """
+    if degree not in DEGREES:
+        raise ValueError(f"degree must be one of {DEGREES}, got {degree!r}")
+    if isinstance(tidy, pd.DataFrame) and tidy.empty:
+        return pd.DataFrame(columns=TRAJECTORY_COLUMNS)
+
+    Y, baseline, analytes, astronauts, days = _deviation_cube(as_cube(tidy), stretch)
+    p = degree + 1
+
+    # Shared design matrix; days are scaled to <= 1 so t^2 stays well conditioned
+    scale = max(np.abs(days).max(), 1.0) if len(days) else 1.0
+    X = (days / scale)[:, None] ** np.arange(p)             # D x p
+    W = (~np.isnan(Y)).astype(float)                         # A x S x D
+    Yz = np.where(W > 0, Y, 0.0)
+
+    XtX = np.einsum("asd,dp,dq->aspq", W, X, X)
+    Xty = np.einsum("asd,dp->asp", W * Yz, X)
+    n = W.sum(axis=2)
+    first = np.where(W > 0, days, np.inf).min(axis=2)
+    last = np.where(W > 0, days, -np.inf).max(axis=2)
+
+    ## Per astronaut (A x S fits) and pooled (A fits, normal equations summed over astronauts)
+    # identifiable with at least p distinct days (one draw per day per astronaut)
+    n_astronauts = (n > 0).sum(axis=1)
+    pooled_days = (W.sum(axis=1) > 0).sum(axis=1)
+    pooled_n = np.where(n_astronauts >= 2, n.sum(axis=1), 0)
+    beta_s = _solve(XtX, Xty, n >= p)
+    beta_p = _solve(XtX.sum(axis=1), Xty.sum(axis=1), (n_astronauts >= 2) & (pooled_days >= p))
+
+    rss_s = (W * (Yz - beta_s @ X.T) ** 2).sum(axis=2)
+    rss_p = (W * (Yz - (beta_p @ X.T)[:, None, :]) ** 2).sum(axis=(1, 2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        se_s = np.where(n > p, np.sqrt(rss_s / (n - p)), np.nan)
+        se_p = np.where(pooled_n > p, np.sqrt(rss_p / (pooled_n - p)), np.nan)
+        pooled_baseline = np.nanmean(np.where(n > 0, baseline, np.nan), axis=1)
+
+    # back to per-day units
+    beta_s = beta_s / scale ** np.arange(p)
+    beta_p = beta_p / scale ** np.arange(p)
+
+    fa, fs = np.nonzero(~np.isnan(beta_s[..., 0]))
+    (pa,) = np.nonzero(~np.isnan(beta_p[:, 0]))
+    coefs = np.full((len(fa) + len(pa), len(COEF_COLUMNS)), np.nan)
+    coefs[:, :p] = np.vstack([beta_s[fa, fs], beta_p[pa]])
+
+    fits = pd.DataFrame({
+        "analyte": analytes.to_numpy()[np.r_[fa, pa]],
+        "astronautID": np.r_[astronauts.to_numpy()[fs], np.full(len(pa), "ALL", dtype=object)],
+        "fit_type": ["astronaut"] * len(fa) + ["pooled"] * len(pa),
+        "degree": degree,
+        "n_points": np.r_[n[fa, fs], pooled_n[pa]].astype(int),
+        "first_day": np.r_[first[fa, fs], first[pa].min(axis=1)],
+        "last_day": np.r_[last[fa, fs], last[pa].max(axis=1)],
+        "baseline": np.r_[baseline[fa, fs], pooled_baseline[pa]],
+        "resid_se": np.r_[se_s[fa, fs], se_p[pa]],
+    })
+    fits[COEF_COLUMNS] = coefs
+
+    # analyte order, astronaut fits before the pooled one (like the stats table)
+    order = np.lexsort((np.r_[fs, np.zeros(len(pa), dtype=int)],
+                        np.r_[np.zeros(len(fa), dtype=int), np.ones(len(pa), dtype=int)],
+                        np.r_[fa, pa]))
+    return fits.iloc[order].reset_index(drop=True)[TRAJECTORY_COLUMNS]
+
+
+def trajectory_curves(fits: pd.DataFrame, n_points: int = 50,
+                      stretch: int = FLIGHT_STRETCH) -> pd.DataFrame:
+    """
+    Fitted curves in value units for every row of `fits` (fit_trajectories
+    output), evaluated at `n_points` days between each fit's first and last
+    post-flight day. Returns analyte, astronautID, fit_type, flight_day, fitted;
+    flight_day is placed on the axis of the given `stretch`.
+    """
+    if fits.empty:
+        return pd.DataFrame(columns=["analyte", "astronautID", "fit_type", "flight_day", "fitted"])
+    grid = np.linspace(0.0, 1.0, n_points)
+    first, last = fits["first_day"].to_numpy(float), fits["last_day"].to_numpy(float)
+    t = first[:, None] + (last - first)[:, None] * grid           # fits x n_points
+    coefs = np.nan_to_num(fits[COEF_COLUMNS].to_numpy(float))
+    fitted = fits["baseline"].to_numpy(float)[:, None] + coefs[:, [0]] + coefs[:, [1]] * t + coefs[:, [2]] * t ** 2
+
+    repeat = lambda col: np.repeat(fits[col].to_numpy(), n_points)
+    return pd.DataFrame({
+        "analyte": repeat("analyte"),
+        "astronautID": repeat("astronautID"),
+        "fit_type": repeat("fit_type"),
+        "flight_day": (t + stretch).ravel(),
+        "fitted": fitted.ravel(),
+    })
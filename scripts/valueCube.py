@@ -0,0 +1,212 @@
+"""
+Dense astronaut x timepoint x analyte value cube, stored as memory-mapped .npy.
+
+Per-query code paths filter the long tidy frame with boolean masks
+(`df[df["analyte"] == analyte]`), a full scan per query. The cube holds the
+same values as one float array indexed by position, so one analyte or one
+astronaut is a slice (a view, no scan), and the label -> position lookups are
+hash lookups on the sidecar indexes.
+
+Files in a cube folder (written next to the other artifacts, see artifactStore):
+    values.npy         float64  astronauts x timepoints x analytes (NaN = no value)
+    rows.npy           int64    same shape; position of the cell's row in the tidy
+                                frame (-1 = no row), so slices keep the frame's order
+    ref_min.npy        float64  same shape; reference-range minimum
+    ref_max.npy        float64  same shape; reference-range maximum
+    cube_labels.json   axis labels: astronauts (+ sex), timepoints in flight-day
+                       order (+ flight_days), analytes (+ label, unit)
+
+open_cube maps the arrays read-only (np.load(mmap_mode="r")), so dashboard
+worker processes share the pages through the OS cache instead of each
+holding a private copy. contrasts, trajectories and correlations read their
+analyte x astronaut x timepoint values from a cube (as_cube) instead of
+pivoting the tidy frame themselves.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .dataCache import replacing
+
+CUBE_ARRAYS = ["values", "rows", "ref_min", "ref_max"]
+CUBE_FILES = [f"{name}.npy" for name in CUBE_ARRAYS] + ["cube_labels.json"]
+
+
+def _label_codes(labels: list) -> tuple:
+    """(codes into sorted categories, categorical dtype) for a sidecar label list (None -> NaN)."""
+    categories = pd.Index(sorted(set(x for x in labels if x is not None)))
+    codes = categories.get_indexer(labels)
+    return codes, pd.CategoricalDtype(categories)
+
+
+def _first_per_group(codes: np.ndarray, values: pd.Series, size: int) -> list:
+    """First non-null value per group code (None where a group has none)."""
+    present = values.notna().to_numpy() & (codes >= 0)
+    first = pd.Series(values.to_numpy(dtype=object)[present]).groupby(codes[present]).first()
+    return [first.get(i) for i in range(size)]
+
+
+class ValueCube:
+    """
+    Value, row-position and reference-range arrays (astronauts x timepoints x
+    analytes) plus axis indexes. Arrays opened with open_cube are read-only
+    memory maps.
+    """
+
+    def __init__(self, arrays: dict, labels: dict):
+        self.values = arrays["values"]
+        self.rows = arrays["rows"]
+        self.ref_min = arrays["ref_min"]
+        self.ref_max = arrays["ref_max"]
+        self.labels = labels
+        self.astronauts = pd.Index(labels["astronauts"], name="astronautID")
+        self.timepoints = pd.Index(labels["timepoints"], name="timepoint")
+        self.analytes = pd.Index(labels["analytes"], name="analyte")
+        self.flight_days = np.array(labels["flight_days"])
+        # position -> categorical code per tidy string column, for tidy_for
+        self._codes = {col: _label_codes(labels[key]) for col, key in
+                       [("astronautID", "astronauts"), ("timepoint", "timepoints"),
+                        ("analyte", "analytes"), ("label", "label"), ("unit", "unit"), ("sex", "sex")]}
+
+    @property
+    def shape(self) -> tuple:
+        return self.values.shape
+
+    @property
+    def day_values(self) -> np.ndarray:
+        """Flight day per timepoint as floats (NaN for labels without a day)."""
+        return np.array(self.labels["flight_days"], dtype=float)
+
+    def by_analyte(self) -> np.ndarray:
+        """analytes x astronauts x timepoints view of the values."""
+        return self.values.transpose(2, 0, 1)
+
+    def analyte(self, name: str) -> np.ndarray:
+        """astronauts x timepoints view of one analyte."""
+        return self.values[:, :, self.analytes.get_loc(name)]
+
+    def subject(self, astronaut_id: str) -> np.ndarray:
+        """timepoints x analytes view of one astronaut."""
+        return self.values[self.astronauts.get_loc(astronaut_id)]
+
+    def reference(self, name: str) -> tuple:
+        """(ref_min, ref_max) astronauts x timepoints views for one analyte."""
+        a = self.analytes.get_loc(name)
+        return self.ref_min[:, :, a], self.ref_max[:, :, a]
+
+    def tidy_for(self, analytes, astronauts=None) -> pd.DataFrame:
+        """
+        Compact tidy rows (TIDY_COLUMNS) for `analytes`, optionally limited to
+        `astronauts`, rebuilt from cube slices: analytes in the order given,
+        each in the row order of the tidy frame the cube was built from.
+        Unknown names are skipped.
+        """
+        a_idx = self.analytes.get_indexer(list(analytes))
+        a_idx = a_idx[a_idx >= 0]
+        s_idx = np.arange(len(self.astronauts)) if astronauts is None \
+            else np.sort(self.astronauts.get_indexer(list(astronauts)))
+        s_idx = s_idx[s_idx >= 0]
+
+        # (analyte, astronaut, timepoint) positions of the rows that exist
+        rows = self.rows[:, :, a_idx][s_idx].transpose(2, 0, 1)         # A' x S' x T
+        a_pos, s_pos, t_pos = np.nonzero(rows >= 0)
+        order = np.lexsort((rows[a_pos, s_pos, t_pos], a_pos))
+        a_pos, s_pos, t_pos = a_idx[a_pos[order]], s_idx[s_pos[order]], t_pos[order]
+
+        def categorical(col, positions):
+            codes, dtype = self._codes[col]
+            return pd.Categorical.from_codes(codes[positions], dtype=dtype, validate=False)
+
+        # built in TIDY_COLUMNS order
+        return pd.DataFrame({
+            "astronautID": categorical("astronautID", s_pos),
+            "timepoint": categorical("timepoint", t_pos),
+            "flight_day": self.flight_days[t_pos],
+            "analyte": categorical("analyte", a_pos),
+            "value": np.asarray(self.values[s_pos, t_pos, a_pos], dtype=float),
+            "min": np.asarray(self.ref_min[s_pos, t_pos, a_pos], dtype=float),
+            "max": np.asarray(self.ref_max[s_pos, t_pos, a_pos], dtype=float),
+            "label": categorical("label", a_pos),
+            "unit": categorical("unit", a_pos),
+            "sex": categorical("sex", s_pos),
+        })
+
+
+def build_cube(tidy: pd.DataFrame) -> ValueCube:
+    """In-memory ValueCube from a tidy frame (duplicate rows are averaged)."""
+    astronaut = pd.Categorical(tidy["astronautID"]).remove_unused_categories()
+    analyte = pd.Categorical(tidy["analyte"]).remove_unused_categories()
+    timepoint = pd.Categorical(tidy["timepoint"]).remove_unused_categories()
+
+    # Timepoint axis in flight-day order (labels without a day last)
+    t_codes = timepoint.codes.astype(np.int64)
+    days = pd.Series(tidy["flight_day"].to_numpy(dtype=float)).groupby(t_codes).first() \
+        .reindex(range(len(timepoint.categories)))
+    order = np.lexsort((np.arange(len(days)), days.fillna(np.inf).to_numpy()))
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    flight_days = days.to_numpy()[order]
+    flight_days = flight_days.astype(np.int64).tolist() if not np.isnan(flight_days).any() \
+        else [None if np.isnan(d) else float(d) for d in flight_days]
+
+    s_codes, a_codes = astronaut.codes.astype(np.int64), analyte.codes.astype(np.int64)
+    keep = (s_codes >= 0) & (t_codes >= 0) & (a_codes >= 0)
+    shape = (len(astronaut.categories), len(timepoint.categories), len(analyte.categories))
+    cell = np.ravel_multi_index((s_codes[keep], rank[t_codes[keep]], a_codes[keep]), shape)
+    size = int(np.prod(shape))
+
+    values = tidy["value"].to_numpy(dtype=float)[keep]
+    has_value = ~np.isnan(values)
+    counts = np.bincount(cell[has_value], minlength=size)
+    sums = np.bincount(cell[has_value], weights=values[has_value], minlength=size)
+    # empty cells get a plain NaN (0/0 would give one with the sign bit set)
+    cube = np.divide(sums, counts, out=np.full(size, np.nan), where=counts > 0)
+    # first tidy row of each cell (assigned last-to-first so the first one wins)
+    rows = np.full(size, -1, dtype=np.int64)
+    rows[cell[::-1]] = np.flatnonzero(keep)[::-1]
+
+    ## Reference ranges per cell (they can differ between timepoints)
+    ref = {}
+    for col, agg in [("min", "min"), ("max", "max")]:
+        per_cell = pd.Series(tidy[col].to_numpy(dtype=float)[keep]).groupby(cell).agg(agg)
+        arr = np.full(size, np.nan)
+        arr[per_cell.index.to_numpy()] = per_cell.to_numpy()
+        ref[col] = arr.reshape(shape)
+
+    labels = {
+        "astronauts": astronaut.categories.tolist(),
+        "sex": _first_per_group(s_codes, tidy["sex"], shape[0]) if "sex" in tidy.columns else [None] * shape[0],
+        "timepoints": timepoint.categories[order].tolist(),
+        "flight_days": flight_days,
+        "analytes": analyte.categories.tolist(),
+        "label": _first_per_group(a_codes, tidy["label"], shape[2]),
+        "unit": _first_per_group(a_codes, tidy["unit"], shape[2]),
+    }
+    arrays = {"values": cube.reshape(shape), "rows": rows.reshape(shape),
+              "ref_min": ref["min"], "ref_max": ref["max"]}
+    return ValueCube(arrays, labels)
+
+
+def as_cube(data) -> ValueCube:
+    """`data` if it already is a ValueCube, else build_cube(data) for a tidy frame."""
+    return data if isinstance(data, ValueCube) else build_cube(data)
+
+
+def write_cube(cube: ValueCube, folder: str):
+    """Write the cube arrays and labels into `folder` (each file replaced atomically, see dataCache.replacing)."""
+    os.makedirs(folder, exist_ok=True)
+    for name in CUBE_ARRAYS:
+        with replacing(os.path.join(folder, f"{name}.npy")) as tmp, open(tmp, "wb") as fh:
+            np.save(fh, np.ascontiguousarray(getattr(cube, name)))
+    with replacing(os.path.join(folder, "cube_labels.json")) as tmp, open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(cube.labels, fh, ensure_ascii=False)
+
+
+def open_cube(folder: str) -> ValueCube:
+    """Memory-map a cube written by write_cube (read-only)."""
+    arrays = {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r") for name in CUBE_ARRAYS}
+    with open(os.path.join(folder, "cube_labels.json"), encoding="utf-8") as fh:
+        labels = json.load(fh)
+    return ValueCube(arrays, labels)
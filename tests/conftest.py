@@ -0,0 +1,5 @@
+import os
+import sys
+
+# scripts/ is imported as a package from the repo root (python -m scripts.X)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,92 @@
+"""
+Equivalence of the batched analyze_r1_vs_L with a groupby/iterrows reference
+(the original per-analyte, per-astronaut implementation) on the final_data
+datasets. Resampling is switched off (n_boot=0, n_perm=0); its columns are NaN.
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from scripts.featureEngineering import add_flight_day
+from scripts.resampling import RESAMPLE_COLUMNS
+from scripts.stats import STATS_COLUMNS, analyze_r1_vs_L, tidy_from_wide
+
+FINAL_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "final_data")
+DATASETS = sorted(glob.glob(os.path.join(FINAL_DATA, "*.csv")))
+
+PARAMETRIC_COLUMNS = [c for c in STATS_COLUMNS if c not in RESAMPLE_COLUMNS]
+
+
+def _values(adf: pd.DataFrame):
+    """(L-series values, R+1 values) of one astronaut's rows."""
+    L_mask = adf["timepoint"].astype(str).str.startswith("L")
+    R1_mask = adf["timepoint"].astype(str).isin(["R+1", "R1", "R+01"])
+    return (adf.loc[L_mask, "value"].dropna().astype(float),
+            adf.loc[R1_mask, "value"].dropna().astype(float))
+
+
+def _reference_stats(tidy: pd.DataFrame) -> pd.DataFrame:
+    """One within row per astronaut and a group row per analyte, like the original version."""
+    results = []
+    for analyte, subdf in tidy.groupby("analyte", observed=True):
+        astronaut_means, astronaut_R1 = [], []
+        for astronaut, adf in subdf.groupby("astronautID", observed=True):
+            L_vals, R1_vals = _values(adf)
+            if not (len(L_vals) >= 2 and len(R1_vals) == 1):
+                continue
+            R1 = float(R1_vals.iloc[0])
+            mean_L = float(L_vals.mean())
+            std_L = float(L_vals.std(ddof=1))
+            n_L = int(L_vals.shape[0])
+            astronaut_means.append(mean_L)
+            astronaut_R1.append(R1)
+            if std_L > 0:
+                se = std_L / np.sqrt(n_L)
+                t_stat = (mean_L - R1) / se
+                p_val = 2 * (1 - stats.t.cdf(abs(t_stat), df=n_L - 1))
+                cohen_d = (R1 - mean_L) / std_L
+            else:
+                se = t_stat = p_val = cohen_d = np.nan
+            results.append({
+                "analyte": analyte, "astronautID": astronaut, "test_type": "within",
+                "n_L": n_L, "mean_L": round(mean_L, 2), "R1": round(R1, 2),
+                "std_L": round(std_L, 2),
+                "se_L": round(se, 2) if pd.notna(se) else np.nan,
+                "t_stat": round(t_stat, 3) if pd.notna(t_stat) else np.nan,
+                "p_value": round(p_val, 4) if pd.notna(p_val) else np.nan,
+                "effect_size": round(cohen_d, 3) if pd.notna(cohen_d) else np.nan,
+            })
+
+        if len(astronaut_means) >= 2:
+            diffs = np.array(astronaut_R1) - np.array(astronaut_means)
+            t_stat, p_val = stats.ttest_rel(astronaut_R1, astronaut_means)
+            cohen_d = diffs.mean() / diffs.std(ddof=1) if diffs.std(ddof=1) > 0 else np.nan
+            results.append({
+                "analyte": analyte, "astronautID": "ALL", "test_type": "group",
+                "n_L": len(astronaut_means),
+                "mean_L": round(float(np.mean(astronaut_means)), 2),
+                "R1": round(float(np.mean(astronaut_R1)), 2),
+                "t_stat": round(float(t_stat), 3),
+                "p_value": round(float(p_val), 4),
+                "effect_size": round(float(cohen_d), 3) if pd.notna(cohen_d) else np.nan,
+            })
+    return pd.DataFrame(results, columns=PARAMETRIC_COLUMNS)
+
+
+def _plain(df: pd.DataFrame) -> pd.DataFrame:
+    out = df[PARAMETRIC_COLUMNS].reset_index(drop=True)
+    out = out.astype({c: object for c in ["analyte", "astronautID", "test_type"]})
+    return out.astype({c: float for c in PARAMETRIC_COLUMNS[3:]})
+
+
+@pytest.mark.parametrize("path", DATASETS, ids=os.path.basename)
+def test_matches_groupby_reference(path):
+    tidy = tidy_from_wide(add_flight_day(pd.read_csv(path)))
+    actual = analyze_r1_vs_L(tidy, n_boot=0, n_perm=0)
+    assert list(actual.columns) == STATS_COLUMNS
+    assert actual[RESAMPLE_COLUMNS].isna().all().all()
+    pd.testing.assert_frame_equal(_plain(actual), _plain(_reference_stats(tidy)), check_exact=True)
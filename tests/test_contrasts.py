@@ -0,0 +1,38 @@
+"""
+The R+1 vs L contrast of analyze_contrasts reproduces analyze_r1_vs_L, from
+a tidy frame and from its ValueCube.
+"""
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+from scripts.contrasts import analyze_contrasts, default_contrasts, make_contrast
+from scripts.featureEngineering import add_flight_day
+from scripts.stats import analyze_r1_vs_L, tidy_from_wide
+from scripts.valueCube import build_cube
+
+FINAL_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "final_data")
+DATASETS = sorted(glob.glob(os.path.join(FINAL_DATA, "*.csv")))
+
+# contrast column -> stats column
+AS_STATS = {"analyte": "analyte", "astronautID": "astronautID", "test_type": "test_type",
+            "n_base": "n_L", "mean_base": "mean_L", "mean_target": "R1", "std_base": "std_L",
+            "se_base": "se_L", "t_stat": "t_stat", "p_value": "p_value", "effect_size": "effect_size"}
+
+
+@pytest.mark.parametrize("path", DATASETS, ids=os.path.basename)
+def test_r1_contrast_matches_analyze_r1_vs_L(path):
+    tidy = tidy_from_wide(add_flight_day(pd.read_csv(path)))
+    expected = analyze_r1_vs_L(tidy, n_boot=0, n_perm=0)[list(AS_STATS.values())]
+    for data in [tidy, build_cube(tidy)]:
+        actual = analyze_contrasts(data, [make_contrast("R+1")])
+        assert (actual["contrast"] == "R+1 vs L").all()
+        actual = actual[list(AS_STATS)].rename(columns=AS_STATS)
+        pd.testing.assert_frame_equal(actual.astype(expected.dtypes.to_dict()), expected, check_exact=True)
+
+
+def test_default_contrasts_one_per_recovery_day():
+    labels = pd.DataFrame({"timepoint": ["L-92", "R+1", "R1", "R+45", "R+82"]})
+    assert [c.name for c in default_contrasts(labels)] == ["R+1 vs L", "R+45 vs L", "R+82 vs L"]
@@ -0,0 +1,53 @@
+"""
+Whole-matrix pairwise correlations against DataFrame.corr, and the sample
+matrix against a pivot_table of the tidy frame.
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.correlations import DEFAULT_MIN_PERIODS, correlation_matrix, sample_matrix
+from scripts.featureEngineering import add_flight_day
+from scripts.stats import tidy_from_wide
+from scripts.valueCube import build_cube
+
+FINAL_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "final_data")
+DATASETS = sorted(glob.glob(os.path.join(FINAL_DATA, "*.csv")))
+
+
+@pytest.fixture(scope="module", params=DATASETS, ids=os.path.basename)
+def tidy(request):
+    return tidy_from_wide(add_flight_day(pd.read_csv(request.param)))
+
+
+@pytest.mark.parametrize("phase", [None, "L", "R"])
+def test_sample_matrix_matches_pivot(tidy, phase):
+    rows = tidy.dropna(subset=["value"]).astype({"astronautID": str, "timepoint": str, "analyte": str})
+    if phase is not None:
+        rows = rows[rows["timepoint"].str.upper().str.startswith(phase)]
+    expected = rows.pivot_table(index=["astronautID", "timepoint"], columns="analyte",
+                                values="value", aggfunc="mean")
+    for data in [tidy, build_cube(tidy)]:
+        actual = sample_matrix(data, phase).loc[:, expected.columns]
+        pd.testing.assert_frame_equal(actual, expected, check_names=False, check_index_type=False,
+                                      check_column_type=False, check_dtype=False)
+
+
+@pytest.mark.parametrize("phase", [None, "L", "R"])
+def test_pearson_matches_dataframe_corr(tidy, phase):
+    samples = sample_matrix(tidy, phase)
+    expected = samples.corr(min_periods=DEFAULT_MIN_PERIODS)
+    np.testing.assert_allclose(correlation_matrix(tidy, "pearson", phase).to_numpy(),
+                               expected.to_numpy(), rtol=1e-9, atol=1e-12)
+
+
+def test_spearman_matches_dataframe_corr_without_gaps(tidy):
+    samples = sample_matrix(tidy)
+    complete = samples.columns[samples.notna().all()]
+    assert len(complete) >= 2
+    expected = samples[complete].corr(method="spearman", min_periods=DEFAULT_MIN_PERIODS)
+    actual = correlation_matrix(tidy, "spearman").loc[complete, complete]
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-12)
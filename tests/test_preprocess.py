@@ -0,0 +1,36 @@
+"""
+Incremental preprocess runs: unchanged inputs are neither re-hashed nor
+re-split, and outputs are recognised whatever the crew-ID format.
+"""
+import pandas as pd
+
+import preprocess
+
+
+def _write_input(path, ids):
+    pd.DataFrame({"Sample Name": [f"{i}_serum_L-3" for i in ids], "value": range(len(ids))}) \
+        .to_csv(path, index=False)
+
+
+def test_only_changed_inputs_are_hashed_and_split(tmp_path, monkeypatch):
+    _write_input(tmp_path / "A.csv", ["X101", "Y7"])
+    _write_input(tmp_path / "B.csv", ["X101"])
+    assert preprocess.process_files(tmp_path, workers=1) == ["A.csv", "B.csv"]
+    assert (tmp_path / "A_Y7.csv").exists()
+
+    hashed = []
+    signature = preprocess.file_signature
+    monkeypatch.setattr(preprocess, "file_signature", lambda p: hashed.append(p.name) or signature(p))
+    assert preprocess.process_files(tmp_path, workers=1) == []
+    assert hashed == []
+
+    _write_input(tmp_path / "B.csv", ["X101", "Z9"])
+    assert preprocess.process_files(tmp_path, workers=1) == ["B.csv"]
+    assert hashed == ["B.csv"]
+
+
+def test_outputs_recognised_without_manifest(tmp_path):
+    _write_input(tmp_path / "A.csv", ["X101", "Y7"])
+    preprocess.process_files(tmp_path, workers=1)
+    (tmp_path / preprocess.MANIFEST_NAME).unlink()
+    assert [f.name for f in preprocess._input_files(tmp_path, {})] == ["A.csv"]
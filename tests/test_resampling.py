@@ -0,0 +1,98 @@
+"""
+Permutation p-values and bootstrap CIs of resampling.py against brute-force
+enumeration and np.percentile on the expanded draws, plus seed
+reproducibility and independence from chunking and worker processes.
+"""
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts import resampling
+from scripts.featureEngineering import add_flight_day
+from scripts.resampling import (RESAMPLE_COLUMNS, _row_percentiles, _sign_flip_p,
+                                _sign_flip_patterns, _within_perm_p, resample_r1_vs_L)
+from scripts.stats import _r1_vs_L_summary, tidy_from_wide
+
+FINAL_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "final_data")
+
+
+@pytest.fixture(scope="module")
+def metabolic():
+    tidy = tidy_from_wide(add_flight_day(pd.read_csv(os.path.join(FINAL_DATA, "Metabolic_Panel.csv"))))
+    return tidy, _r1_vs_L_summary(tidy)
+
+
+def _brute_within_p(L, r1):
+    """Each draw in turn as 'R+1': share of relabelings at least as extreme."""
+    pool = np.append(L[~np.isnan(L)], r1)
+    stat = [abs(pool[i] - np.delete(pool, i).mean()) for i in range(len(pool))]
+    return np.mean([s >= stat[-1] * (1 - 1e-9) for s in stat])
+
+
+def _brute_sign_flip_p(diffs):
+    d = diffs[~np.isnan(diffs)]
+    observed = abs(d.sum())
+    flips = [abs(np.dot(signs, d)) for signs in itertools.product([1, -1], repeat=len(d))]
+    return np.mean([f >= observed * (1 - 1e-9) for f in flips])
+
+
+def test_within_perm_p_matches_enumeration():
+    rng = np.random.default_rng(1)
+    L = rng.normal(size=(200, 4)).round(1)           # rounding creates ties
+    L[rng.random(L.shape) < 0.2] = np.nan
+    L[:, :2] = np.where(np.isnan(L[:, :2]), 0.5, L[:, :2])   # at least two L draws
+    R1 = rng.normal(size=200).round(1)
+    expected = [_brute_within_p(L[i], R1[i]) for i in range(len(L))]
+    np.testing.assert_allclose(_within_perm_p(L, R1), expected)
+
+
+def test_sign_flip_p_matches_enumeration():
+    rng = np.random.default_rng(2)
+    diffs = rng.normal(size=(100, 6)).round(1)
+    diffs[rng.random(diffs.shape) < 0.25] = np.nan
+    signs, exact = _sign_flip_patterns(diffs.shape[1], rng, n_perm=0)
+    assert exact and len(signs) == 2 ** 6
+    expected = [_brute_sign_flip_p(row) for row in diffs]
+    np.testing.assert_allclose(_sign_flip_p(diffs, signs, exact), expected)
+
+
+def test_row_percentiles_match_expanded_draws():
+    rng = np.random.default_rng(3)
+    x = rng.normal(size=(50, 12)).round(1)
+    x[rng.random(x.shape) < 0.2] = np.nan
+    x[0] = np.nan                                     # a row without valid values
+    weights = rng.integers(1, 6, size=12)
+    quantiles = [2.5, 50, 97.5]
+    actual = _row_percentiles(x, weights, quantiles)
+    for row, got in zip(x, actual):
+        expanded = np.repeat(row, weights)
+        expanded = expanded[~np.isnan(expanded)]
+        want = np.percentile(expanded, quantiles) if len(expanded) else np.full(3, np.nan)
+        np.testing.assert_allclose(got, want)
+
+
+def test_seed_reproducibility(metabolic):
+    tidy, within = metabolic
+    first = resample_r1_vs_L(tidy, within, n_boot=300, n_perm=100, seed=7)
+    pd.testing.assert_frame_equal(first, resample_r1_vs_L(tidy, within, n_boot=300, n_perm=100, seed=7))
+    other = resample_r1_vs_L(tidy, within, n_boot=300, n_perm=100, seed=8)
+    assert not np.allclose(first["diff_ci_low"], other["diff_ci_low"], equal_nan=True)
+
+
+def test_independent_of_chunks_and_workers(metabolic, monkeypatch):
+    tidy, within = metabolic
+    expected = resample_r1_vs_L(tidy, within, n_boot=300, seed=7)
+    monkeypatch.setattr(resampling, "MAX_BATCH_CELLS", 500)
+    pd.testing.assert_frame_equal(resample_r1_vs_L(tidy, within, n_boot=300, seed=7), expected)
+    pd.testing.assert_frame_equal(resample_r1_vs_L(tidy, within, n_boot=300, seed=7, workers=2), expected)
+
+
+def test_zero_counts_skip_resampling(metabolic):
+    tidy, within = metabolic
+    out = resample_r1_vs_L(tidy, within, n_boot=0, n_perm=0)
+    assert len(out) and out[RESAMPLE_COLUMNS].isna().all().all()
+    with pytest.raises(ValueError):
+        resample_r1_vs_L(tidy, within, n_boot=-1)
@@ -0,0 +1,72 @@
+"""
+Equivalence of the vectorized tidy_from_wide with a row-by-row reference
+(the original iterrows() implementation) on the final_data datasets.
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.featureEngineering import add_flight_day, parse_timepoint
+from scripts.stats import ANALYTE_INFO, TIDY_COLUMNS, _first_col_startswith, tidy_from_wide
+from scripts.subjectIndex import load_subject_index
+
+FINAL_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "final_data")
+DATASETS = sorted(glob.glob(os.path.join(FINAL_DATA, "*.csv")))
+
+
+def _reference_tidy(df: pd.DataFrame) -> pd.DataFrame:
+    """One record per (analyte, row), built with iterrows() like the original version."""
+    sexes = load_subject_index().subjects["sex"]
+    colmap = {c.lower(): c for c in df.columns}
+    astronaut_col, timepoint_col = colmap["astronautid"], colmap["timepoint"]
+    records = []
+    for analyte, meta in ANALYTE_INFO.items():
+        if analyte == "anion_gap":
+            continue
+        value_col = _first_col_startswith(df, f"{analyte}_value") \
+            or _first_col_startswith(df, f"{analyte}_concentration")
+        if value_col is None:
+            continue
+        min_col = _first_col_startswith(df, [f"{analyte}_range_min", f"{analyte}_min"])
+        max_col = _first_col_startswith(df, [f"{analyte}_range_max", f"{analyte}_max"])
+        for _, row in df.iterrows():
+            records.append({
+                "astronautID": row[astronaut_col],
+                "timepoint": row[timepoint_col],
+                "flight_day": parse_timepoint(row[timepoint_col]),
+                "analyte": analyte,
+                "value": row[value_col],
+                "min": row[min_col] if (min_col and pd.notna(row[min_col])) else meta.get("min"),
+                "max": row[max_col] if (max_col and pd.notna(row[max_col])) else meta.get("max"),
+                "label": meta["label"],
+                "unit": meta["unit"],
+                "sex": sexes.get(str(row[astronaut_col]).strip().upper()),
+            })
+    return pd.DataFrame(records, columns=TIDY_COLUMNS)
+
+
+def _plain(tidy: pd.DataFrame) -> pd.DataFrame:
+    """Categoricals as objects and numbers as float, for a dtype-agnostic comparison."""
+    out = tidy.reset_index(drop=True).copy()
+    for col in ["astronautID", "timepoint", "analyte", "label", "unit", "sex"]:
+        out[col] = np.asarray(out[col], dtype=object)
+        out[col] = out[col].where(out[col].notna(), None)
+    for col in ["flight_day", "value", "min", "max"]:
+        out[col] = pd.to_numeric(out[col], errors="coerce").astype(float)
+    return out
+
+
+@pytest.mark.parametrize("path", DATASETS, ids=os.path.basename)
+def test_matches_rowwise_reference(path):
+    df = pd.read_csv(path)
+    expected = _plain(_reference_tidy(df))
+    actual = _plain(tidy_from_wide(add_flight_day(df)))
+    assert list(actual.columns) == TIDY_COLUMNS
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_final_data_present():
+    assert DATASETS, "final_data/*.csv fixtures are missing"
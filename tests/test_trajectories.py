@@ -0,0 +1,54 @@
+"""
+Batched recovery-trajectory fits against np.polyfit on each astronaut's (and
+the pooled) post-flight deviations from the L-series baseline.
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.featureEngineering import FLIGHT_STRETCH, add_flight_day
+from scripts.stats import tidy_from_wide
+from scripts.trajectories import COEF_COLUMNS, fit_trajectories
+
+FINAL_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "final_data")
+DATASETS = sorted(glob.glob(os.path.join(FINAL_DATA, "*.csv")))
+
+
+def _deviations(tidy: pd.DataFrame) -> pd.DataFrame:
+    """analyte, astronautID, t (days since return), y (value - L baseline), one row per day."""
+    tidy = tidy.dropna(subset=["value"]).astype({"analyte": object, "astronautID": object, "timepoint": str})
+    base = tidy[tidy["timepoint"].str.startswith("L")].groupby(["analyte", "astronautID"])["value"].mean()
+    post = tidy[tidy["timepoint"].str.startswith("R") & tidy["flight_day"].notna()]
+    post = post.assign(t=post["flight_day"] - FLIGHT_STRETCH) \
+        .groupby(["analyte", "astronautID", "t"], as_index=False)["value"].mean()
+    post["y"] = post["value"] - base.reindex(pd.MultiIndex.from_frame(post[["analyte", "astronautID"]])).to_numpy()
+    return post.dropna(subset=["y"])
+
+
+def _polyfit(points: pd.DataFrame, degree: int):
+    """(coefficients low -> high order, residual SE) of one least-squares fit."""
+    coefs = np.polyfit(points["t"], points["y"], degree)[::-1]
+    resid = points["y"] - np.polynomial.polynomial.polyval(points["t"], coefs)
+    dof = len(points) - degree - 1
+    return coefs, np.sqrt((resid ** 2).sum() / dof) if dof > 0 else np.nan
+
+
+@pytest.mark.parametrize("degree", [1, 2])
+@pytest.mark.parametrize("path", DATASETS, ids=os.path.basename)
+def test_matches_polyfit(path, degree):
+    tidy = tidy_from_wide(add_flight_day(pd.read_csv(path)))
+    fits = fit_trajectories(tidy, degree)
+    points = _deviations(tidy)
+    assert len(fits)
+    for row in fits.itertuples(index=False):
+        sub = points[points["analyte"] == row.analyte]
+        if row.fit_type == "astronaut":
+            sub = sub[sub["astronautID"] == row.astronautID]
+        coefs, se = _polyfit(sub, degree)
+        assert row.n_points == len(sub)
+        np.testing.assert_allclose([getattr(row, c) for c in COEF_COLUMNS[:degree + 1]], coefs,
+                                   rtol=1e-6, atol=1e-9)
+        np.testing.assert_allclose(row.resid_se, se, rtol=1e-6, atol=1e-9)